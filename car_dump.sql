@@ -68,11 +68,15 @@ VALUES
 --     `usage` INT,
 
 DROP TABLE IF EXISTS `Cars`;
+-- Parsed numeric columns back the /cars filters so they can use indexes;
+-- the text columns keep the display strings scraped from the listing.
+-- Existing databases: run scripts/migrate_numeric_columns.py
+
 CREATE TABLE `Cars` (
     `id` INT AUTO_INCREMENT PRIMARY KEY,
     `title` text NOT NULL,
-    `make` text NOT NULL,
-    `model` text NOT NULL,
+    `make` varchar(64) NOT NULL,
+    `model` varchar(128) NOT NULL,
     `modelTitle` text, 
     `condition` text,
     `year` text,
@@ -81,9 +85,30 @@ CREATE TABLE `Cars` (
     `monthlyPayment` text ,
     `dealer` text,
     `region` text,
-    `state` text,
+    `state` varchar(8),
     `value` float,
     `style` text,
-    `link` text NOT NULL,
-    `time` text NOT NULL
+    `link` varchar(512) NOT NULL,
+    `time` text NOT NULL,
+    `price_num` int unsigned NOT NULL DEFAULT 0,
+    `mileage_num` int unsigned NOT NULL DEFAULT 0,
+    `year_num` smallint unsigned,
+    `fingerprint` char(40),
+    `first_seen` datetime,
+    `last_seen` datetime,
+    UNIQUE KEY `uniq_link` (`link`),
+    KEY `idx_last_seen` (`last_seen`),
+    KEY `idx_make_model_state_value` (`make`, `model`, `state`, `value`),
+    KEY `idx_price_mileage_value` (`price_num`, `mileage_num`, `value`),
+    KEY `idx_mileage_price_value` (`mileage_num`, `price_num`, `value`),
+    KEY `idx_value` (`value`)
+);
+
+-- Write counter per table; the scraper bumps it so API caches know when Cars changed
+
+DROP TABLE IF EXISTS `DataVersion`;
+CREATE TABLE `DataVersion` (
+    `name` varchar(64) PRIMARY KEY,
+    `version` bigint unsigned NOT NULL DEFAULT 0,
+    `updated_at` datetime NOT NULL
 );
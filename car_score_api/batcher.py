@@ -0,0 +1,164 @@
+# batcher.py
+
+import os
+import queue
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock, Thread
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-description calls into predict_batch calls.
+
+    Request threads submit() one description and block on its result. One
+    worker thread takes the first queued request, waits up to max_wait_ms
+    for more (or until max_batch_size are queued), then runs a single NER
+    call and forward pass for the whole batch and hands each caller its own
+    result. Requests with different modes are batched separately. Callers
+    wait at most timeout seconds, and a worker thread that died is replaced
+    on the next submit().
+    """
+
+    def __init__(self, predict_batch, max_batch_size=32, max_wait_ms=5.0, queue_size=1024, timeout=60.0):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        # Created on first use in each process: a thread started before a fork does not survive it
+        self._start_lock = Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+        self._stats_lock = Lock()
+        self.requests = 0
+        self.batches = 0
+        self.full_flushes = 0
+        self.timeout_flushes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.batch_sizes = {}
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.batch_seconds_total = 0.0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.queue_size)
+            elif self._thread.is_alive():
+                return
+            else:
+                # Same process, dead thread: a new one picks up what is still queued
+                print("Predict batcher thread died; restarting it")
+                with self._stats_lock:
+                    self.restarts += 1
+            self._thread = Thread(target=self._run, name="predict-batcher", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, text, mode=None, timeout=None):
+        """Score one description; returns {'score': ...} or {'error': ...}.
+        Raises TimeoutError if no result arrives within timeout (default self.timeout) seconds."""
+        self._ensure_started()
+        timeout = self.timeout if timeout is None else timeout
+        future = Future()
+        try:
+            self._queue.put((text, mode, future, time.monotonic()), timeout=timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise TimeoutError(f"Prediction queue still full after {timeout}s")
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise TimeoutError(f"No prediction within {timeout}s")
+
+    def _collect(self):
+        """Block for one request, then gather more until the batch is full or max_wait passes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._process(batch)
+            except Exception as e:
+                # Never leave a caller waiting on a batch that blew up outside predict_batch
+                print(f"Predict batcher failed: {e}")
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _process(self, batch):
+        started = time.monotonic()
+
+        by_mode = {}
+        for item in batch:
+            by_mode.setdefault(item[1], []).append(item)
+
+        failed = 0
+        for mode, items in by_mode.items():
+            try:
+                results = self.predict_batch([text for text, _, _, _ in items], mode=mode)
+            except Exception as e:
+                failed += len(items)
+                for _, _, future, _ in items:
+                    future.set_exception(e)
+                continue
+            for (_, _, future, _), result in zip(items, results):
+                future.set_result(result)
+
+        elapsed = time.monotonic() - started
+        waits = [started - submitted for _, _, _, submitted in batch]
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            if len(batch) >= self.max_batch_size:
+                self.full_flushes += 1
+            else:
+                self.timeout_flushes += 1
+            self.errors += failed
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            self.wait_seconds_total += sum(waits)
+            self.wait_seconds_max = max(self.wait_seconds_max, max(waits))
+            self.batch_seconds_total += elapsed
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "full_flushes": self.full_flushes,
+                "timeout_flushes": self.timeout_flushes,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts,
+                # Time a request sat in the queue before its batch started
+                "wait_ms_avg": round(self.wait_seconds_total / self.requests * 1000, 3) if self.requests else 0.0,
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+                "batch_ms_avg": round(self.batch_seconds_total / self.batches * 1000, 3) if self.batches else 0.0,
+            }
@@ -0,0 +1,306 @@
+# benchmark_predictor.py
+#
+# Where predict time goes, stage by stage, without network access. NER uses
+# the locally cached BERT model if there is one and a rule-based stand-in
+# otherwise (--ner stub forces it). Stages, timed separately:
+#
+#   ner               the token-classification pipeline over a batch
+#   model_matching    ModelMatcher.find over the catalog trie
+#   regex_extraction  the rest of extract_car_info (regexes, entity merge)
+#   prepare_features  FeatureEncoder rows as served, scaling included
+#   scaling           FeatureEncoder's input scaling step alone (a part of prepare_features;
+#                     None for hashed models, where it is folded into the first layer)
+#   forward           the MLP as configured (--inference)
+#   inverse_scaling   undoing the target scaling
+#
+# Sweeps batch sizes and input-length buckets drawn from
+# model/training_cars_data.csv and writes JSON. --baseline compares against a
+# previous run and exits non-zero if a stage got slower than --tolerance; it
+# refuses (exit 2) if the runs differ in NER backend, inference mode, encoding
+# or torch threads, unless --force is given.
+#
+#   python benchmark_predictor.py --out bench.json
+#   python benchmark_predictor.py --baseline bench.json --tolerance 0.25
+
+import os
+
+# Never reach out to the Hugging Face hub
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+import argparse
+import json
+import platform
+import re
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+
+from car_score_predictor import INFERENCE_MODES, MODEL_DIR, CarScorePredictor
+from compare_extraction import load_descriptions
+from model_bundle import BUNDLE_NAME, load_bundle
+
+STAGES = ['ner', 'model_matching', 'regex_extraction', 'prepare_features', 'scaling', 'forward', 'inverse_scaling']
+
+# Settings that must match for a baseline comparison to mean anything
+COMPARABLE_META = ['ner_backend', 'inference', 'encoding', 'torch_threads']
+
+# Stages that make up a prediction; scaling is already inside prepare_features
+TOTAL_STAGES = [stage for stage in STAGES if stage != 'scaling']
+
+NER_BACKENDS = ('auto', 'local', 'stub')
+
+
+class StubNER:
+    """Rule-based stand-in for the NER pipeline: same call shape and output keys"""
+
+    ORG_RE = re.compile(r'\bat\s+([A-Z][\w&.\- ]+)')
+    MISC_RE = re.compile(r'\b(?:19|20)\d{2}\s+([A-Z][\w\-]*(?:\s+[A-Z0-9][\w\-]*)*)')
+
+    def _entities(self, text):
+        entities = []
+        for label, pattern in (('MISC', self.MISC_RE), ('ORG', self.ORG_RE)):
+            match = pattern.search(text)
+            if match:
+                entities.append({
+                    'entity_group': label, 'word': match.group(1).strip(), 'score': 1.0,
+                    'start': match.start(1), 'end': match.end(1),
+                })
+        return entities
+
+    def __call__(self, texts):
+        if isinstance(texts, str):
+            return self._entities(texts)
+        return [self._entities(text) for text in texts]
+
+
+class ReplayMatcher:
+    """Answers find() from precomputed results so extraction timing excludes matching"""
+
+    def __init__(self, texts, matches):
+        self.matches = dict(zip(texts, matches))
+
+    def find(self, text):
+        return self.matches[text]
+
+
+def load_predictor(ner, inference):
+    predictor = CarScorePredictor(ner_mode='ner', cache_size=0, inference=inference)
+    backend = ner
+    if ner in ('auto', 'local'):
+        try:
+            predictor.ner_pipeline
+            backend = 'local'
+        except Exception as e:
+            if ner == 'local':
+                raise RuntimeError(f"No locally cached NER model: {e}")
+            backend = 'stub'
+    if backend == 'stub':
+        predictor._ner_pipeline = StubNER()
+        predictor.ner_loaded.set()
+    return predictor, backend
+
+
+def time_batches(predictor, texts, batch_size, repeat):
+    """Median seconds per stage for running every text through in batches"""
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    encoder = predictor.encoder
+    dense = predictor.sparse_model is None
+    matcher = predictor.model_matcher
+
+    runs = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        seconds = dict.fromkeys(STAGES, 0.0)
+        for batch in batches:
+            start = time.perf_counter()
+            entities = predictor.run_ner(batch, 'ner')
+            seconds['ner'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            matches = [matcher.find(text) for text in batch]
+            seconds['model_matching'] += time.perf_counter() - start
+
+            predictor.model_matcher = ReplayMatcher(batch, matches)
+            try:
+                start = time.perf_counter()
+                car_infos = [predictor.extract_car_info(text, ents, 'ner') for text, ents in zip(batch, entities)]
+                seconds['regex_extraction'] += time.perf_counter() - start
+            finally:
+                predictor.model_matcher = matcher
+
+            start = time.perf_counter()
+            features = predictor.prepare_features_batch(car_infos)
+            seconds['prepare_features'] += time.perf_counter() - start
+
+            if dense:
+                # Gather the raw inputs untimed, then time the encoder's own scaling calls
+                numeric = encoder.numeric_values(car_infos) if len(encoder.numeric_fields) else None
+                _, columns, values = encoder.categorical_entries(car_infos)
+                start = time.perf_counter()
+                if numeric is not None:
+                    encoder.scale_numeric(numeric)
+                encoder.scale_entries(columns, values)
+                seconds['scaling'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            with torch.no_grad():
+                output = predictor.runner(*features) if isinstance(features, tuple) else predictor.runner(features)
+            seconds['forward'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            predictor.output_scaler.inverse_transform(output.cpu().numpy().reshape(-1, 1))
+            seconds['inverse_scaling'] += time.perf_counter() - start
+
+        for stage in STAGES:
+            runs[stage].append(seconds[stage])
+
+    stages = {}
+    for stage in STAGES:
+        if stage == 'scaling' and not dense:
+            stages[stage] = None
+            continue
+        median = float(np.median(runs[stage]))
+        stages[stage] = {
+            'ms_per_row': round(median / len(texts) * 1000, 5),
+            'ms_per_batch': round(median / len(batches) * 1000, 5),
+        }
+    total = sum(stages[stage]['ms_per_row'] for stage in TOTAL_STAGES)
+    return {'rows': len(texts), 'batches': len(batches), 'total_ms_per_row': round(total, 5), 'stages': stages}
+
+
+def length_buckets(texts, count):
+    """Split texts into `count` groups of similar length, shortest first"""
+    ordered = sorted(texts, key=len)
+    return [list(group) for group in np.array_split(np.array(ordered, dtype=object), count) if len(group)]
+
+
+def metadata(predictor, ner_backend):
+    meta = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'torch_threads': torch.get_num_threads(),
+        'ner_backend': ner_backend,
+        'inference': predictor.inference,
+        'encoding': predictor.encoder.encoding,
+        'features': len(predictor.model_features),
+    }
+    try:
+        import transformers
+        meta['transformers'] = transformers.__version__
+    except ImportError:
+        pass
+    bundle_path = os.path.join(MODEL_DIR, BUNDLE_NAME)
+    if os.path.exists(bundle_path):
+        meta['bundle_created'] = load_bundle(bundle_path).metadata['created']
+    return meta
+
+
+def meta_mismatches(meta, baseline_meta):
+    """(key, baseline value, current value) for every COMPARABLE_META setting that differs"""
+    return [
+        (key, baseline_meta.get(key), meta.get(key))
+        for key in COMPARABLE_META if baseline_meta.get(key) != meta.get(key)
+    ]
+
+
+def find_regressions(report, baseline, tolerance, min_ms):
+    """(sweep, key, stage, baseline ms, current ms) for every stage that slowed down past tolerance"""
+    regressions = []
+    for sweep, key_name in (('batch_sizes', 'batch_size'), ('input_lengths', 'bucket')):
+        previous = {entry[key_name]: entry for entry in baseline.get(sweep, [])}
+        for entry in report[sweep]:
+            old = previous.get(entry[key_name])
+            if old is None:
+                continue
+            for stage in STAGES + ['total']:
+                before = old['total_ms_per_row'] if stage == 'total' else (old['stages'].get(stage) or {}).get('ms_per_row')
+                after = entry['total_ms_per_row'] if stage == 'total' else (entry['stages'].get(stage) or {}).get('ms_per_row')
+                if before is None or after is None:
+                    continue
+                if after > before * (1 + tolerance) and after - before > min_ms:
+                    regressions.append((sweep, entry[key_name], stage, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of the prediction pipeline")
+    parser.add_argument('--csv', default=os.path.join(MODEL_DIR, 'training_cars_data.csv'))
+    parser.add_argument('--rows', type=int, default=1024, help="Descriptions used per sweep point")
+    parser.add_argument('--batch-sizes', default='1,8,32,128')
+    parser.add_argument('--length-buckets', type=int, default=4, help="Input-length groups (shortest to longest)")
+    parser.add_argument('--length-batch-size', type=int, default=32, help="Batch size for the length sweep")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--ner', choices=NER_BACKENDS, default='auto',
+                        help="local: cached BERT model; stub: rule-based stand-in; auto: local if cached")
+    parser.add_argument('--inference', choices=INFERENCE_MODES, default='folded')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="Write the JSON results here instead of stdout")
+    parser.add_argument('--baseline', help="Previous results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown per stage (0.25 = 25%%)")
+    parser.add_argument('--min-ms', type=float, default=0.005, help="Ignore slowdowns smaller than this per row")
+    parser.add_argument('--force', action='store_true',
+                        help="Compare against a baseline recorded with different settings anyway")
+    args = parser.parse_args()
+
+    predictor, ner_backend = load_predictor(args.ner, args.inference)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        mismatches = meta_mismatches(metadata(predictor, ner_backend), baseline.get('meta', {}))
+        for key, before, after in mismatches:
+            print(f"Baseline {key} is {before!r}, this run's is {after!r}", file=sys.stderr)
+        if mismatches and not args.force:
+            print("Not comparing runs with different settings (--force to compare anyway)", file=sys.stderr)
+            sys.exit(2)
+    texts = load_descriptions(args.csv)
+    rng = np.random.default_rng(args.seed)
+    sample = [texts[i] for i in rng.choice(len(texts), size=min(args.rows, len(texts)), replace=False)]
+
+    # Untimed pass so lazy initialization doesn't land in the first sweep point
+    time_batches(predictor, sample[:64], 32, 1)
+
+    report = {'meta': metadata(predictor, ner_backend), 'batch_sizes': [], 'input_lengths': []}
+    for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+        result = time_batches(predictor, sample, batch_size, args.repeat)
+        report['batch_sizes'].append({'batch_size': batch_size, **result})
+        print(f"batch {batch_size:>4}: {result['total_ms_per_row']:.4f} ms/row", file=sys.stderr)
+
+    for i, bucket in enumerate(length_buckets(sample, args.length_buckets)):
+        lengths = [len(text) for text in bucket]
+        result = time_batches(predictor, bucket, args.length_batch_size, args.repeat)
+        report['input_lengths'].append({
+            'bucket': i, 'min_chars': min(lengths), 'max_chars': max(lengths),
+            'mean_chars': round(float(np.mean(lengths)), 1), **result,
+        })
+        print(f"length {min(lengths)}-{max(lengths)} chars: {result['total_ms_per_row']:.4f} ms/row", file=sys.stderr)
+
+    regressions = []
+    if baseline is not None:
+        regressions = find_regressions(report, baseline, args.tolerance, args.min_ms)
+        report['regressions'] = [
+            {'sweep': sweep, 'key': key, 'stage': stage, 'baseline_ms_per_row': before, 'ms_per_row': after}
+            for sweep, key, stage, before, after in regressions
+        ]
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for sweep, key, stage, before, after in regressions:
+        print(f"Regression: {sweep}={key} {stage} {before:.4f} -> {after:.4f} ms/row", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,15 @@ import joblib
 import json
 import re
 import os
-from transformers import pipeline
+import time
+import warnings
+from threading import Event, Lock, Thread
 from torch import nn
+from feature_encoder import FeatureEncoder
+from metrics import BATCH_ROWS, STAGE_SECONDS
+from model_bundle import BUNDLE_NAME, is_stale, load_bundle
+from model_matcher import ModelMatcher
+from ttl_cache import TTLCache
 
 # Get base dir of current file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,6 +25,17 @@ SCRIPT_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "scripts"))
 # Set Device
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# Hugging Face models, loaded on first use
+NER_MODEL = "dslim/bert-base-NER"
+QA_MODEL = "distilbert-base-uncased-distilled-squad"
+
+# 'ner' runs the BERT NER pipeline, 'regex' relies on the regex and catalog matchers only
+NER_MODES = ('ner', 'regex')
+
+# How the MLP runs: 'eager' as trained, 'folded' with BatchNorm merged into the
+# next Linear and Dropout removed, 'torchscript' folded then traced and frozen
+INFERENCE_MODES = ('eager', 'folded', 'torchscript')
+
 # Model Definition
 class ImprovedMLP(nn.Module):
     def __init__(self, input_size):
@@ -36,54 +54,275 @@ class ImprovedMLP(nn.Module):
     
     def forward(self, x):
         return self.net(x)
-        
+
+
+class SparseInputMLP(nn.Module):
+    """ImprovedMLP fed sparse raw features instead of dense scaled rows.
+
+    The input StandardScaler is folded into the first Linear, which becomes
+    an EmbeddingBag summing weighted columns, so a request only touches the
+    columns of the features it has, however wide the model input is.
+    """
+
+    def __init__(self, mlp, mean, scale):
+        super().__init__()
+        first = mlp.net[0]
+        inv_scale = torch.as_tensor(1.0 / np.asarray(scale), dtype=torch.float64)
+        mean = torch.as_tensor(np.asarray(mean), dtype=torch.float64)
+
+        # W @ ((x - mean) * inv_scale) + b == (W * inv_scale) @ x + (b - (W * inv_scale) @ mean)
+        weight = first.weight.detach().double() * inv_scale
+        bias = first.bias.detach().double() - weight @ mean
+
+        self.first = nn.EmbeddingBag(weight.shape[1], weight.shape[0], mode='sum')
+        self.first.weight.data = weight.t().contiguous().float()
+        self.bias = nn.Parameter(bias.float(), requires_grad=False)
+        self.rest = mlp.net[1:]
+
+    def forward(self, indices, offsets, weights):
+        return self.rest(self.first(indices, offsets, per_sample_weights=weights) + self.bias)
+
+
+class FoldedMLP(nn.Module):
+    """Inference-only ImprovedMLP: Linear -> ReLU -> Linear -> ReLU -> Linear"""
+
+    def __init__(self, mlp):
+        super().__init__()
+        self.net = fold_batchnorm(mlp.net)
+
+    def forward(self, x):
+        return self.net(x)
+
+
+def fold_batchnorm(layers):
+    """Eval-mode copy of a Sequential with Dropout removed and each BatchNorm1d
+    merged into the Linear after it.
+
+    ImprovedMLP normalizes after the ReLU, so the BatchNorm can't go into the
+    Linear before it, but as an affine map y = x * a + c it folds into the next
+    one: W @ (x * a + c) + b == (W * a) @ x + (W @ c + b). Layers that don't
+    change are shared, not copied.
+    """
+    folded = []
+    pending = None
+    for layer in layers:
+        if isinstance(layer, nn.Dropout):
+            continue
+        if isinstance(layer, nn.BatchNorm1d) and pending is None:
+            pending = layer
+            continue
+        if pending is not None and isinstance(layer, nn.Linear):
+            with torch.no_grad():
+                a = torch.rsqrt(pending.running_var + pending.eps)
+                c = -pending.running_mean * a
+                if pending.affine:
+                    a = a * pending.weight
+                    c = c * pending.weight + pending.bias
+                fused = nn.Linear(layer.in_features, layer.out_features)
+                fused.weight.copy_(layer.weight * a)
+                fused.bias.copy_(layer.weight @ c + (layer.bias if layer.bias is not None else 0))
+            folded.append(fused)
+            pending = None
+            continue
+        if pending is not None:
+            folded.append(pending)
+            pending = None
+        folded.append(layer)
+    if pending is not None:
+        folded.append(pending)
+    return nn.Sequential(*folded).eval()
+
+
+def quantize_ner_model(model):
+    """Dynamic int8 quantization of the NER model's Linear layers (CPU only)"""
+    with warnings.catch_warnings():
+        # Eager-mode quantization is deprecated in favour of torchao, which we don't depend on
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
 
 class CarScorePredictor:
-    def __init__(self):
+    def __init__(self, ner_mode='ner', warmup=False, cache_size=10000, cache_ttl=3600,
+                 inference='folded', quantize_ner=False, verbose=True):
+        if ner_mode not in NER_MODES:
+            raise ValueError(f"ner_mode must be one of {NER_MODES}, got {ner_mode!r}")
+        if inference not in INFERENCE_MODES:
+            raise ValueError(f"inference must be one of {INFERENCE_MODES}, got {inference!r}")
+        self.ner_mode = ner_mode
+        self.inference = inference
+        self.quantize_ner = quantize_ner and device.type == 'cpu'
+        # Print each extracted car info (debugging only: a stdout write per request)
+        self.verbose = verbose
         
-        self.input_scaler = joblib.load(os.path.join(MODEL_DIR, 'scaler.pkl'))
-        self.output_scaler = joblib.load(os.path.join(MODEL_DIR, 'model_scaler.pkl'))
+        # One memory-mapped file if train.py (or model_bundle.py) wrote a current one
+        bundle_path = os.path.join(MODEL_DIR, BUNDLE_NAME)
+        bundle = None
+        if os.path.exists(bundle_path) and not is_stale(MODEL_DIR, bundle_path):
+            bundle = load_bundle(bundle_path)
+
+        if bundle is not None:
+            self.input_scaler = bundle.input_scaler
+            self.output_scaler = bundle.output_scaler
+            self.model_features = bundle.feature_names
+            self.encoding = bundle.encoding
+            self.default_values = bundle.default_values
+        else:
+            print(f"No current {BUNDLE_NAME}, loading the separate artifacts (run model_bundle.py to build it)")
+            self.input_scaler = joblib.load(os.path.join(MODEL_DIR, 'scaler.pkl'))
+            self.output_scaler = joblib.load(os.path.join(MODEL_DIR, 'model_scaler.pkl'))
 
-        # Load model features
-        with open(os.path.join(MODEL_DIR, 'model_features.json'), 'r') as f:
-            self.model_features = json.load(f)
+            # Load model features
+            with open(os.path.join(MODEL_DIR, 'model_features.json'), 'r') as f:
+                self.model_features = json.load(f)
+
+            # Categorical encoding the model was trained with (onehot if not recorded)
+            self.encoding = {'encoding': 'onehot'}
+            encoding_path = os.path.join(MODEL_DIR, 'encoding.json')
+            if os.path.exists(encoding_path):
+                with open(encoding_path, 'r') as f:
+                    self.encoding = json.load(f)
+
+            # Get mean values for imputation from the training data
+            self.default_values = pd.read_pickle(os.path.join(MODEL_DIR, 'X_train.pkl')).mean()
 
         with open(os.path.join(SCRIPT_DIR, 'all_make_model_keys.json'), 'r') as f:
             self.model_slugs = json.load(f)
         
         self.model_types = [slug.replace('_', ' ').replace('-', ' ').title() for slug in self.model_slugs]
+        self.model_matcher = ModelMatcher(self.model_types)
 
-
-        # Get mean values for imputation from the training data
-        self.X_train_df = pd.read_pickle(os.path.join(MODEL_DIR,'X_train.pkl'))
-        self.default_values = self.X_train_df.mean()
-
-        # List of known categorical fields that were one-hot encoded
-        self.one_hot_prefixes = ['Condition_', 'Model_', 'Dealer_']  
+        # Precompiled column lookup and fused input scaling
+        self.encoder = FeatureEncoder(
+            self.model_features, self.default_values, self.input_scaler,
+            encoding=self.encoding['encoding'], hash_buckets=self.encoding.get('hash_buckets')
+        )
         
         # Initialize the neural network
         self.model = ImprovedMLP(input_size=len(self.model_features))  
-        self.model.load_state_dict(torch.load(os.path.join(MODEL_DIR, 'best_car_model.pth'), weights_only=True))
+        if bundle is not None:
+            # assign=True keeps the parameters on the mapped pages instead of copying them
+            self.model.load_state_dict(bundle.state_dict(), assign=True)
+        else:
+            self.model.load_state_dict(torch.load(os.path.join(MODEL_DIR, 'best_car_model.pth'), weights_only=True))
         self.model.to(device)
         self.model.eval()
-        
-        # Initialize LLM for information extraction
-        self.ner_pipeline = pipeline(
-            "token-classification",
-            model="dslim/bert-base-NER",
-            aggregation_strategy="simple"
-        )
-        
-        # Initialize LLM for text understanding
-        self.qa_pipeline = pipeline(
-            "question-answering",
-            model="distilbert-base-uncased-distilled-squad"
-        )
 
-    def extract_car_info(self, text):
+        # Hashed models take sparse input, so requests never build full-width rows
+        self.sparse_model = None
+        if self.encoder.encoding == 'hashed':
+            self.sparse_model = SparseInputMLP(self.model, self.encoder.mean, 1.0 / self.encoder.inv_scale)
+            self.sparse_model.to(device)
+            self.sparse_model.eval()
+
+        # What score_features actually runs
+        self.runner = self.build_runner(self.inference)
+
+        # Scores keyed by the encoded car info, so wording variants share entries.
+        # The model is never reloaded, so a retrained one needs a restart anyway.
+        self.cache = None
+        if cache_size:
+            self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+
+        # Transformer pipelines are built lazily on first use
+        self._ner_pipeline = None
+        self._qa_pipeline = None
+        self._pipeline_lock = Lock()
+
+        # The MLP is loaded by now, so the predictor can serve (regex mode right
+        # away, NER mode by loading the pipeline on the first request).
+        # ner_loaded only tracks the NER pipeline.
+        self.ner_loaded = Event()
+        self.warmup_error = None
+        if self.ner_mode == 'ner' and warmup:
+            Thread(target=self.warm_up, name="predictor-warmup", daemon=True).start()
+
+    @property
+    def ner_pipeline(self):
+        """LLM for information extraction, loaded on first access"""
+        if self._ner_pipeline is None:
+            with self._pipeline_lock:
+                if self._ner_pipeline is None:
+                    from transformers import pipeline
+                    ner_pipeline = pipeline(
+                        "token-classification",
+                        model=NER_MODEL,
+                        aggregation_strategy="simple"
+                    )
+                    if self.quantize_ner:
+                        ner_pipeline.model = quantize_ner_model(ner_pipeline.model)
+                    self._ner_pipeline = ner_pipeline
+                    self.warmup_error = None
+                    self.ner_loaded.set()
+        return self._ner_pipeline
+
+    @property
+    def qa_pipeline(self):
+        """LLM for text understanding, loaded on first access"""
+        if self._qa_pipeline is None:
+            with self._pipeline_lock:
+                if self._qa_pipeline is None:
+                    from transformers import pipeline
+                    self._qa_pipeline = pipeline(
+                        "question-answering",
+                        model=QA_MODEL
+                    )
+        return self._qa_pipeline
+
+    def build_runner(self, inference):
+        """The MLP (sparse-input for hashed models) prepared for the given inference mode"""
+        if inference == 'eager':
+            return self.sparse_model if self.sparse_model is not None else self.model
+
+        folded = FoldedMLP(self.model)
+        if self.sparse_model is not None:
+            runner = SparseInputMLP(folded, self.encoder.mean, 1.0 / self.encoder.inv_scale)
+            example = (torch.tensor([0, 1]), torch.tensor([0, 1]), torch.ones(2))
+        else:
+            runner = folded
+            example = (torch.zeros(2, len(self.model_features)),)
+        runner.to(device)
+        runner.eval()
+
+        if inference == 'torchscript':
+            example = tuple(t.to(device) for t in example)
+            with torch.no_grad(), warnings.catch_warnings():
+                # TorchScript is deprecated upstream but still the dependency-free export we have
+                warnings.simplefilter("ignore", FutureWarning)
+                runner = torch.jit.freeze(torch.jit.trace(runner, example))
+        return runner
+
+    def warm_up(self):
+        """Load the NER pipeline and run it once so the first request is fast"""
+        try:
+            self.ner_pipeline("2020 Toyota Camry at CarMax")
+            print("Predictor warm-up finished.")
+        except Exception as e:
+            self.warmup_error = str(e)
+            print(f"Predictor warm-up failed: {e}")
+
+    def resolve_mode(self, mode):
+        """Per-call extraction mode, falling back to the configured ner_mode"""
+        if mode is None:
+            return self.ner_mode
+        if mode not in NER_MODES:
+            raise ValueError(f"mode must be one of {NER_MODES}, got {mode!r}")
+        return mode
+
+    def run_ner(self, texts, mode=None):
+        """Run NER on one text or a list of texts, or skip it in regex mode"""
+        if self.resolve_mode(mode) == 'regex':
+            return [[] for _ in texts] if isinstance(texts, list) else []
+        # Load the pipeline outside the timer: its one-off load is not a NER call
+        ner_pipeline = self.ner_pipeline
+        with STAGE_SECONDS.time(stage='ner'):
+            return ner_pipeline(texts)
+
+    def extract_car_info(self, text, entities=None, mode=None):
         """Extract structured car information from natural language"""
-        # Extract entities using NER
-        entities = self.ner_pipeline(text)
+        # Extract entities using NER (batch callers pass them in precomputed)
+        if entities is None:
+            entities = self.run_ner(text, mode)
+        start = time.perf_counter()
 
         # Initialize default values
         car_info = {
@@ -150,13 +389,8 @@ class CarScorePredictor:
                 except:
                     pass
 
-        # Try to find a matching model from the list
-        found_model = None
-        for model in self.model_types:
-            pattern = re.compile(rf'\b{re.escape(model)}\b', re.IGNORECASE)
-            if pattern.search(text):
-                found_model = model
-                break
+        # Try to find the longest matching model from the list
+        found_model = self.model_matcher.find(text)
 
         if found_model:
             car_info['Model'] = found_model
@@ -178,49 +412,137 @@ class CarScorePredictor:
                 dealer_name = re.sub(r'\bdealer\b', '', dealer_name, flags=re.IGNORECASE).strip()
                 car_info['Dealer'] = dealer_name
 
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage='extraction')
         return car_info
     
+    def extract_car_info_batch(self, texts, mode=None):
+        """Extract car information for a list of texts with one NER call.
+        Returns (car_info, error) pairs in input order."""
+        mode = self.resolve_mode(mode)
+        try:
+            all_entities = self.run_ner(list(texts), mode)
+        except Exception:
+            # Fall back to per-item NER so one bad input cannot fail the batch
+            all_entities = [None] * len(texts)
+
+        results = []
+        for text, entities in zip(texts, all_entities):
+            try:
+                results.append((self.extract_car_info(text, entities, mode), None))
+            except Exception as e:
+                results.append((None, str(e)))
+        return results
+
     def prepare_features(self, car_info):
         """Convert extracted car info into the model input vector"""
-        # Initialize feature row with zeros
-        feature_vector = np.zeros(len(self.model_features))
-        feature_df = pd.DataFrame([feature_vector], columns=self.model_features)
-
-        # Fill in numerical fields
-        for col in ['Year', 'Mileage', 'Price', 'Monthly Payment', 'Accidents', 'Owners']:
-            val = car_info.get(col)
-            if val is not None:
-                feature_df.at[0, col] = val
+        return self.prepare_features_batch([car_info])
+
+    def prepare_features_batch(self, car_infos):
+        """Encode the model input for several cars: a dense scaled tensor, or
+        (indices, offsets, weights) tensors when the model takes sparse input"""
+        with STAGE_SECONDS.time(stage='features'):
+            if self.sparse_model is not None:
+                return tuple(torch.from_numpy(part).to(device) for part in self.encoder.encode_sparse(car_infos))
+            features = self.encoder.encode(car_infos)
+            return torch.from_numpy(features).to(device)
+
+    def concat_features(self, rows):
+        """Join single-row outputs of prepare_features into one batch"""
+        if not isinstance(rows[0], tuple):
+            return torch.cat(rows)
+        # Each row's offsets are [0]; shift them by the indices that come before it
+        sizes = [len(indices) for indices, _, _ in rows]
+        offsets = torch.tensor([0] + sizes[:-1], dtype=torch.int64, device=device).cumsum(0)
+        return (
+            torch.cat([indices for indices, _, _ in rows]),
+            offsets,
+            torch.cat([weights for _, _, weights in rows]),
+        )
+
+    def score_features(self, features):
+        """Run the network and undo the target scaling for prepared features"""
+        with torch.no_grad(), STAGE_SECONDS.time(stage='model'):
+            if isinstance(features, tuple):
+                prediction = self.runner(*features)
             else:
-                feature_df.at[0, col] = self.default_values[col]
-
-        # Fill in one-hot fields
-        for prefix in self.one_hot_prefixes:
-            value = car_info.get(prefix)
-            if value is not None:
-                encoded = f"{prefix}_{value}"
-                if encoded in self.model_features:
-                    feature_df.at[0, encoded] = 1.0
-
-        # Apply input scaling
-        scaled_features = self.input_scaler.transform(feature_df.values)
-        
-        # Convert to tensor
-        return torch.tensor(scaled_features, dtype=torch.float32).to(device)
+                prediction = self.runner(features)
+            scores = self.output_scaler.inverse_transform(prediction.cpu().numpy().reshape(-1, 1))
+        return scores[:, 0]
 
     
-    def predict_score(self, text_input):
+    def predict_score(self, text_input, mode=None):
         """Main prediction pipeline"""
         # Extract information from text
-        car_info = self.extract_car_info(text_input)
-        print("Extracted car info:", car_info)
+        car_info = self.extract_car_info(text_input, mode=mode)
+        if self.verbose:
+            print("Extracted car info:", car_info)
+
+        key = None
+        if self.cache is not None:
+            key = self.encoder.cache_key(car_info)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
         
         # Prepare features for model
         features_tensor = self.prepare_features(car_info)
         
         # Make prediction
-        with torch.no_grad():
-            prediction = self.model(features_tensor)
-            score = self.output_scaler.inverse_transform(prediction.cpu().numpy().reshape(-1, 1))
-        
-        return score[0][0]
+        score = float(self.score_features(features_tensor)[0])
+        if key is not None:
+            self.cache.put(key, score)
+        return score
+
+    def predict_batch(self, texts, mode=None):
+        """Score a list of descriptions with one NER call and one forward pass.
+        Returns one {'score': ...} or {'error': ...} dict per input, in order."""
+        BATCH_ROWS.observe(len(texts))
+        results = [None] * len(texts)
+        pending = []  # (index, car_info, cache key) of rows that need the network
+
+        for i, (car_info, error) in enumerate(self.extract_car_info_batch(texts, mode)):
+            if error is not None:
+                results[i] = {'error': error}
+                continue
+
+            # Serve cached scores and only run the network for misses
+            key = None
+            if self.cache is not None:
+                try:
+                    key = self.encoder.cache_key(car_info)
+                except Exception as e:
+                    results[i] = {'error': str(e)}
+                    continue
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[i] = {'score': cached}
+                    continue
+
+            pending.append((i, car_info, key))
+
+        if not pending:
+            return results
+
+        try:
+            features = self.prepare_features_batch([car_info for _, car_info, _ in pending])
+        except Exception:
+            # Encode one at a time so a bad row only fails itself, and keep the good rows' features
+            kept, rows = [], []
+            for i, car_info, key in pending:
+                try:
+                    rows.append(self.prepare_features(car_info))
+                    kept.append((i, car_info, key))
+                except Exception as e:
+                    results[i] = {'error': str(e)}
+            if not kept:
+                return results
+            pending = kept
+            features = self.concat_features(rows)
+
+        scores = self.score_features(features)
+        for (i, _, key), score in zip(pending, scores):
+            results[i] = {'score': float(score)}
+            if key is not None:
+                self.cache.put(key, float(score))
+
+        return results
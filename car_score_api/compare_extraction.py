@@ -0,0 +1,108 @@
+# compare_extraction.py
+#
+# Runs the NER and regex-only extraction modes over the training listings
+# and reports how often each field agrees, how far the scores drift and how
+# much faster the regex-only path is.
+#
+#   python compare_extraction.py --limit 2000 --batch-size 64
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from car_score_predictor import CarScorePredictor, MODEL_DIR
+
+FIELDS = ['Year', 'Model', 'Mileage', 'Price', 'Condition', 'Dealer',
+          'Monthly Payment', 'Accidents', 'Owners', 'Usage']
+
+
+def load_descriptions(csv_path, limit=None):
+    """Format training rows the same way save_to_mysql describes listings"""
+    df = pd.read_csv(csv_path, dtype=str).fillna('')
+    if limit:
+        df = df.head(limit)
+
+    descriptions = []
+    for row in df.itertuples(index=False):
+        car_model, condition, mileage, price, payment, dealer = row[:6]
+        parts = car_model.split(' ', 1)
+        year, model = (parts[0], parts[1]) if len(parts) == 2 else ('', car_model)
+        descriptions.append(
+            f"{condition} {year} {model} with {mileage} miles, priced at {price} or {payment} at {dealer}"
+        )
+    return descriptions
+
+
+def run_mode(predictor, texts, mode, batch_size):
+    """Extract every text in batches, returning car infos and elapsed seconds"""
+    car_infos = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        for car_info, error in predictor.extract_car_info_batch(texts[i:i + batch_size], mode=mode):
+            car_infos.append(car_info if error is None else {})
+    return car_infos, time.perf_counter() - start
+
+
+def score(predictor, car_infos):
+    return predictor.score_features(predictor.prepare_features_batch(car_infos))
+
+
+def compare(predictor, texts, batch_size):
+    ner_infos, ner_seconds = run_mode(predictor, texts, 'ner', batch_size)
+    regex_infos, regex_seconds = run_mode(predictor, texts, 'regex', batch_size)
+
+    agreement = {}
+    for field in FIELDS:
+        same = sum(a.get(field) == b.get(field) for a, b in zip(ner_infos, regex_infos))
+        agreement[field] = round(same / len(texts), 4) if texts else 0.0
+
+    exact_rows = sum(all(a.get(f) == b.get(f) for f in FIELDS) for a, b in zip(ner_infos, regex_infos))
+    score_diff = np.abs(score(predictor, ner_infos) - score(predictor, regex_infos))
+
+    return {
+        'rows': len(texts),
+        'batch_size': batch_size,
+        'field_agreement': agreement,
+        'row_agreement': round(exact_rows / len(texts), 4) if texts else 0.0,
+        'score_abs_diff_mean': float(score_diff.mean()) if len(texts) else 0.0,
+        'score_abs_diff_max': float(score_diff.max()) if len(texts) else 0.0,
+        'ner_seconds': round(ner_seconds, 3),
+        'regex_seconds': round(regex_seconds, 3),
+        'ner_ms_per_row': round(1000 * ner_seconds / max(len(texts), 1), 3),
+        'regex_ms_per_row': round(1000 * regex_seconds / max(len(texts), 1), 3),
+        'speedup': round(ner_seconds / regex_seconds, 1) if regex_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare NER and regex-only extraction")
+    parser.add_argument('--csv', default=os.path.join(MODEL_DIR, 'training_cars_data.csv'))
+    parser.add_argument('--limit', type=int, default=None, help="Only use the first N rows")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    texts = load_descriptions(args.csv, args.limit)
+    predictor = CarScorePredictor(ner_mode='ner')
+    report = compare(predictor, texts, args.batch_size)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Compared {report['rows']} listings (batch size {report['batch_size']})")
+    for field, rate in report['field_agreement'].items():
+        print(f"  {field:<16} {rate * 100:6.2f}% agree")
+    print(f"  {'All fields':<16} {report['row_agreement'] * 100:6.2f}% agree")
+    print(f"Score difference: mean {report['score_abs_diff_mean']:.3f}, max {report['score_abs_diff_max']:.3f}")
+    print(f"NER:   {report['ner_ms_per_row']:.2f} ms/row ({report['ner_seconds']}s)")
+    print(f"Regex: {report['regex_ms_per_row']:.2f} ms/row ({report['regex_seconds']}s)")
+    print(f"Speedup: {report['speedup']}x")
+
+
+if __name__ == "__main__":
+    main()
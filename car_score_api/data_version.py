@@ -0,0 +1,38 @@
+# data_version.py
+#
+# A per-table counter the scraper bumps on every write, so API caches can
+# tell whether Cars changed with one primary-key lookup.
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS `DataVersion` (
+        `name` varchar(64) PRIMARY KEY,
+        `version` bigint unsigned NOT NULL DEFAULT 0,
+        `updated_at` datetime NOT NULL
+    )
+"""
+
+
+def ensure_table(cursor):
+    cursor.execute(CREATE_TABLE)
+
+
+def bump(cursor, name='Cars'):
+    """Record a write to the table; call inside the writer's transaction"""
+    cursor.execute(
+        """
+        INSERT INTO DataVersion (name, version, updated_at) VALUES (%s, 1, UTC_TIMESTAMP())
+        ON DUPLICATE KEY UPDATE version = version + 1, updated_at = UTC_TIMESTAMP()
+        """,
+        (name,)
+    )
+
+
+def read(cursor, name='Cars'):
+    """Return (version, updated_at), or (None, None) if it is not tracked yet"""
+    try:
+        cursor.execute("SELECT version, updated_at FROM DataVersion WHERE name = %s", (name,))
+    except Exception:
+        # Table missing on a database that predates it
+        return None, None
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (None, None)
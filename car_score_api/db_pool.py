@@ -0,0 +1,175 @@
+# db_pool.py
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+
+import pymysql
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQL connections.
+
+    At most max_size connections are checked out at once; callers wait up to
+    checkout_timeout seconds for one. Idle connections older than
+    max_idle_time are closed instead of reused, and ones idle longer than
+    health_check_interval are pinged before being handed out.
+    """
+
+    def __init__(self, connect, max_size=10, max_idle_time=300, checkout_timeout=5.0, health_check_interval=30):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+
+        self._slots = BoundedSemaphore(max_size)
+        self._idle = deque()  # (connection, returned_at)
+        self._lock = Lock()
+
+        self.in_use = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.failed_health_checks = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self.closed += 1
+
+    def _healthy(self, conn, idle_for):
+        if not getattr(conn, 'open', True):
+            return False
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._lock:
+                self.failed_health_checks += 1
+            return False
+
+    def acquire(self):
+        """Check out a connection, waiting up to checkout_timeout seconds"""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No database connection available after {self.checkout_timeout}s")
+
+        waited = time.monotonic() - start
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    conn = self.connect()
+                    with self._lock:
+                        self.created += 1
+                    break
+
+                candidate, returned_at = entry
+                idle_for = time.monotonic() - returned_at
+                if idle_for > self.max_idle_time or not self._healthy(candidate, idle_for):
+                    self._close(candidate)
+                else:
+                    conn = candidate
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection; discarded or broken ones are closed"""
+        try:
+            if not discard:
+                # End any open transaction so the next user sees fresh data
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+
+            if discard:
+                self._close(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            self.release(conn, discard=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "failed_health_checks": self.failed_health_checks,
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+def create_pool(config, local_infile=False, **overrides):
+    """Build a pool from the app config's db_config and optional db_pool blocks"""
+    db_config = config['db_config']
+    pool_config = dict(config.get('db_pool', {}))
+    pool_config.update(overrides)
+
+    def connect():
+        return pymysql.connect(
+            host=db_config['host'],
+            user=db_config['user'],
+            password=db_config['password'],
+            database=db_config['database'],
+            local_infile=local_infile,  # needed for LOAD DATA LOCAL INFILE
+        )
+
+    return ConnectionPool(connect, **pool_config)
@@ -0,0 +1,182 @@
+# feature_encoder.py
+
+import re
+import zlib
+
+import numpy as np
+
+# Numerical fields copied straight from the extracted car info
+NUMERIC_FIELDS = ['Year', 'Mileage', 'Price', 'Monthly Payment', 'Accidents', 'Owners']
+
+# Categorical fields that were one-hot encoded as '<field>_<value>' in training
+ONE_HOT_FIELDS = ['Condition', 'Model', 'Dealer']
+
+# 'onehot': one column per training value; 'hashed': Model and Dealer go into a
+# fixed number of '<field>#<bucket>' columns however many values there are
+ENCODINGS = ('onehot', 'hashed')
+HASHED_FIELDS = ['Model', 'Dealer']
+
+
+def normalize_category(value):
+    return ' '.join(re.findall(r'[a-z0-9&]+', str(value).lower()))
+
+
+def hashed_features(field, value, buckets):
+    """{bucket: weight} for one categorical value.
+
+    The whole value gets weight 1 and its words share another 1, so a dealer
+    or trim never seen in training still lands on the buckets of the words
+    it has in common with known ones ('Toyota of Naperville' -> 'toyota').
+    crc32 keeps buckets stable across processes, unlike hash().
+    """
+    text = normalize_category(value)
+    if not text:
+        return {}
+    features = {zlib.crc32(f"{field}={text}".encode()) % buckets: 1.0}
+    words = text.split()
+    if len(words) > 1:
+        for word in words:
+            bucket = zlib.crc32(f"{field}~{word}".encode()) % buckets
+            features[bucket] = features.get(bucket, 0.0) + 1.0 / len(words)
+    return features
+
+
+def hashed_feature_names(field, buckets):
+    return [f"{field}#{bucket}" for bucket in range(buckets)]
+
+
+class FeatureEncoder:
+    """Precompiled encoder from car info dicts to scaled model input rows.
+
+    The column lookup, imputation defaults and StandardScaler parameters are
+    resolved once, so encoding is a few vectorized writes into a preallocated
+    array instead of building a DataFrame per request.
+    """
+
+    def __init__(self, model_features, default_values, input_scaler, encoding='onehot', hash_buckets=None):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {ENCODINGS}, got {encoding!r}")
+        self.model_features = list(model_features)
+        self.column_index = {name: i for i, name in enumerate(self.model_features)}
+        width = len(self.model_features)
+
+        # Hashed fields map straight to '<field>#0' + bucket; the rest stay one-hot
+        self.encoding = encoding
+        self.hash_buckets = dict(hash_buckets or {}) if encoding == 'hashed' else {}
+        self.hash_offsets = {field: self.column_index[f"{field}#0"] for field in self.hash_buckets}
+        self.one_hot_fields = [field for field in ONE_HOT_FIELDS if field not in self.hash_buckets]
+
+        # Only numerical fields the model was trained on take part
+        self.numeric_fields = [col for col in NUMERIC_FIELDS if col in self.column_index]
+        self.numeric_columns = np.array([self.column_index[col] for col in self.numeric_fields], dtype=np.intp)
+        self.numeric_defaults = np.array([default_values[col] for col in self.numeric_fields], dtype=np.float64)
+
+        # Fold the StandardScaler into an affine step: scaled = (x - mean) * inv_scale
+        mean = getattr(input_scaler, 'mean_', None)
+        scale = getattr(input_scaler, 'scale_', None)
+        self.mean = np.zeros(width) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.inv_scale = np.ones(width) if scale is None else 1.0 / np.asarray(scale, dtype=np.float64)
+
+        # Scaled values of an all-zero row
+        self.zero_row = ((0.0 - self.mean) * self.inv_scale).astype(np.float32)
+
+        self.numeric_mean = self.mean[self.numeric_columns]
+        self.numeric_inv_scale = self.inv_scale[self.numeric_columns]
+
+    def categorical_features(self, car_info):
+        """(column, raw value) pairs of the categorical features set for one car"""
+        features = []
+        for field in self.one_hot_fields:
+            value = car_info.get(field)
+            if value is not None:
+                index = self.column_index.get(f"{field}_{value}")
+                if index is not None:
+                    features.append((index, 1.0))
+        for field, buckets in self.hash_buckets.items():
+            value = car_info.get(field)
+            if value is not None:
+                offset = self.hash_offsets[field]
+                features.extend((offset + bucket, weight) for bucket, weight in hashed_features(field, value, buckets).items())
+        return features
+
+    def numeric_values(self, car_infos):
+        """Raw numerical fields, imputing the training means for missing values"""
+        raw = np.array(
+            [[np.nan if car_info.get(col) is None else car_info[col] for col in self.numeric_fields]
+             for car_info in car_infos],
+            dtype=np.float64
+        ).reshape(len(car_infos), len(self.numeric_fields))
+        return np.where(np.isnan(raw), self.numeric_defaults, raw)
+
+    def cache_key(self, car_info):
+        """Hashable key shared by every car info that encodes to the same row"""
+        numerics = tuple(
+            None if car_info.get(col) is None else float(car_info[col])
+            for col in self.numeric_fields
+        )
+        return numerics + tuple(sorted(self.categorical_features(car_info)))
+
+    def encode(self, car_infos):
+        """Encode a list of car info dicts into a scaled float32 matrix"""
+        n = len(car_infos)
+        out = np.empty((n, len(self.model_features)), dtype=np.float32)
+        out[:] = self.zero_row
+
+        if n == 0:
+            return out
+
+        # Numerical fields, imputing the training means for missing values
+        if len(self.numeric_fields):
+            out[:, self.numeric_columns] = self.scale_numeric(self.numeric_values(car_infos))
+
+        # Categorical fields
+        rows, columns, values = self.categorical_entries(car_infos)
+        if len(rows):
+            out[rows, columns] = self.scale_entries(columns, values)
+
+        return out
+
+    def categorical_entries(self, car_infos):
+        """(rows, columns, raw values) arrays of every categorical feature set in a batch"""
+        rows, columns, values = [], [], []
+        for i, car_info in enumerate(car_infos):
+            for index, value in self.categorical_features(car_info):
+                rows.append(i)
+                columns.append(index)
+                values.append(value)
+        return (
+            np.array(rows, dtype=np.intp),
+            np.array(columns, dtype=np.intp),
+            np.array(values, dtype=np.float64),
+        )
+
+    def scale_numeric(self, raw):
+        """Scale the numeric_values() matrix"""
+        return (raw - self.numeric_mean) * self.numeric_inv_scale
+
+    def scale_entries(self, columns, values):
+        """Scale categorical values at the given columns"""
+        return ((values - self.mean[columns]) * self.inv_scale[columns]).astype(np.float32)
+
+    def encode_sparse(self, car_infos):
+        """Raw (unscaled) non-zero features in EmbeddingBag layout: indices, offsets, weights.
+
+        Work and memory scale with the features a car actually has, not with
+        the width of the model input; the scaler is folded into the first layer
+        (see SparseInputMLP).
+        """
+        numeric = self.numeric_values(car_infos) if len(self.numeric_fields) else None
+        indices, weights, offsets = [], [], []
+        for i, car_info in enumerate(car_infos):
+            offsets.append(len(indices))
+            if numeric is not None:
+                indices.extend(self.numeric_columns)
+                weights.extend(numeric[i])
+            for index, value in self.categorical_features(car_info):
+                indices.append(index)
+                weights.append(value)
+        return (
+            np.array(indices, dtype=np.int64),
+            np.array(offsets, dtype=np.int64),
+            np.array(weights, dtype=np.float32),
+        )
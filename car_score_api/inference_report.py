@@ -0,0 +1,164 @@
+# inference_report.py
+#
+# Accuracy against latency for the predictor's optimized inference modes,
+# measured on the listings in model/training_cars_data.csv:
+#
+#   MLP  eager (as trained) vs folded (BatchNorm merged, Dropout removed) vs
+#        torchscript (folded, traced and frozen): score drift from eager,
+#        single-row latency and batched throughput
+#   NER  fp32 vs dynamic int8: latency per description, how often the
+#        extracted entities and car fields agree, and the end-to-end score drift
+#
+#   python inference_report.py
+#   python inference_report.py --rows 500 --no-ner --json
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+from car_score_predictor import INFERENCE_MODES, MODEL_DIR, CarScorePredictor
+from compare_extraction import FIELDS, load_descriptions
+
+
+def score_with(predictor, runner, features):
+    predictor.runner = runner
+    return predictor.score_features(features)
+
+
+def median_seconds(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def mlp_report(predictor, car_infos, batch_size, single_rows, repeat):
+    features = predictor.prepare_features_batch(car_infos)
+    singles = [predictor.prepare_features_batch([info]) for info in car_infos[:single_rows]]
+    batches = [predictor.prepare_features_batch(car_infos[i:i + batch_size])
+               for i in range(0, len(car_infos), batch_size)]
+
+    baseline = None
+    results = {}
+    for mode in INFERENCE_MODES:
+        start = time.perf_counter()
+        runner = predictor.build_runner(mode)
+        build_seconds = time.perf_counter() - start
+
+        scores = score_with(predictor, runner, features)
+        if baseline is None:
+            baseline = scores
+        drift = np.abs(scores - baseline)
+
+        # Warm the runner before timing (TorchScript optimizes on its first calls)
+        for single in singles[:5]:
+            score_with(predictor, runner, single)
+        single_seconds = [median_seconds(lambda f=single: score_with(predictor, runner, f), repeat) for single in singles]
+        batch_seconds = sum(median_seconds(lambda f=batch: score_with(predictor, runner, f), repeat) for batch in batches)
+
+        results[mode] = {
+            "build_ms": round(build_seconds * 1000, 2),
+            "max_abs_diff": float(drift.max()),
+            "mean_abs_diff": float(drift.mean()),
+            "single_row_p50_us": round(float(np.median(single_seconds)) * 1e6, 1),
+            "single_row_p99_us": round(float(np.percentile(single_seconds, 99)) * 1e6, 1),
+            f"rows_per_second_batch_{batch_size}": round(len(car_infos) / batch_seconds, 1) if batch_seconds else None,
+        }
+    predictor.runner = predictor.build_runner(predictor.inference)
+    return results
+
+
+def entity_signature(entities):
+    return [(entity['entity_group'], entity['word']) for entity in entities]
+
+
+def ner_report(descriptions, batch_size, repeat):
+    predictors = {
+        'fp32': CarScorePredictor(ner_mode='ner', cache_size=0),
+        'int8': CarScorePredictor(ner_mode='ner', cache_size=0, quantize_ner=True),
+    }
+    outputs = {}
+    results = {}
+    for name, predictor in predictors.items():
+        predictor.ner_pipeline(descriptions[:2])  # load and warm up
+        batches = [descriptions[i:i + batch_size] for i in range(0, len(descriptions), batch_size)]
+        seconds = sum(median_seconds(lambda b=batch: predictor.run_ner(b), repeat) for batch in batches)
+
+        entities = predictor.run_ner(descriptions)
+        car_infos = [info for info, _ in predictor.extract_car_info_batch(descriptions)]
+        scores = np.array([r.get('score', np.nan) for r in predictor.predict_batch(descriptions)])
+        outputs[name] = (entities, car_infos, scores)
+        results[name] = {"ms_per_description": round(seconds / len(descriptions) * 1000, 3)}
+
+    base_entities, base_infos, base_scores = outputs['fp32']
+    entities, infos, scores = outputs['int8']
+    field_matches = [
+        (a or {}).get(field) == (b or {}).get(field)
+        for a, b in zip(base_infos, infos) for field in FIELDS
+    ]
+    drift = np.abs(scores - base_scores)
+    results['int8'].update({
+        "same_entities": round(float(np.mean([
+            entity_signature(a) == entity_signature(b) for a, b in zip(base_entities, entities)
+        ])), 4),
+        "same_fields": round(float(np.mean(field_matches)), 4),
+        "max_abs_score_diff": float(np.nanmax(drift)) if np.isfinite(drift).any() else None,
+        "mean_abs_score_diff": float(np.nanmean(drift)) if np.isfinite(drift).any() else None,
+    })
+    results['int8']['speedup'] = round(results['fp32']['ms_per_description'] / results['int8']['ms_per_description'], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the optimized inference modes with the eager baseline")
+    parser.add_argument('--data', default=os.path.join(MODEL_DIR, 'training_cars_data.csv'))
+    parser.add_argument('--rows', type=int, default=0, help="Use only the first N listings (0 = all)")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--single-rows', type=int, default=200, help="Rows timed one at a time")
+    parser.add_argument('--ner-rows', type=int, default=200, help="Descriptions run through NER")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-ner', action='store_true', help="Skip the NER comparison (needs the BERT model)")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    descriptions = load_descriptions(args.data, args.rows or None)
+    report = {"rows": len(descriptions), "torch_threads": torch.get_num_threads()}
+
+    # Regex extraction keeps the MLP comparison deterministic and fast
+    predictor = CarScorePredictor(ner_mode='regex', cache_size=0, inference='eager')
+    car_infos = [info for info, error in predictor.extract_car_info_batch(descriptions) if error is None]
+    report["mlp"] = mlp_report(predictor, car_infos, args.batch_size, args.single_rows, args.repeat)
+
+    if not args.no_ner:
+        try:
+            report["ner"] = ner_report(descriptions[:args.ner_rows], 32, max(1, args.repeat // 2))
+        except Exception as e:
+            report["ner"] = {"skipped": str(e)}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['rows']} listings, {report['torch_threads']} torch threads\n")
+    print("MLP")
+    for mode, r in report["mlp"].items():
+        print(f"  {mode:<12} max diff {r['max_abs_diff']:.2e}  mean diff {r['mean_abs_diff']:.2e}  "
+              f"1 row p50 {r['single_row_p50_us']:>8.1f} us  p99 {r['single_row_p99_us']:>8.1f} us  "
+              f"batch {args.batch_size}: {r[f'rows_per_second_batch_{args.batch_size}']:>10.1f} rows/s")
+    if "ner" in report:
+        print("NER")
+        if "skipped" in report["ner"]:
+            print(f"  skipped: {report['ner']['skipped']}")
+        else:
+            for name, r in report["ner"].items():
+                print(f"  {name:<6} " + "  ".join(f"{key} {value}" for key, value in r.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# load_test.py
+#
+# Closed-loop load test against a running API: at each concurrency level,
+# that many client threads send requests back to back and the latency of
+# every request is recorded. Reports p50/p99 and throughput per level, so
+# the dev server and serve.py can be compared on the same hardware.
+#
+#   python load_test.py --route predict --concurrency 1,2,4,8,16,32
+#   python load_test.py --route mixed --requests 400 --json
+
+import argparse
+import json
+import sys
+import time
+from itertools import cycle
+from threading import Lock, Thread
+
+import numpy as np
+import requests
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from env.config import config
+
+DESCRIPTIONS = [
+    "2018 Honda Civic with 45,000 miles for $17,500, clean title, one owner",
+    "Used 2015 Ford F-150 XLT, 98k miles, asking 21000 at AutoNation",
+    "2021 Toyota Camry SE 12000 miles $24,995 or $389/month",
+    "2012 BMW 3 Series, 130,000 miles, two accidents, 3 owners, 8500 dollars",
+    "Certified 2019 Subaru Outback 38k mi priced at $23,400 from CarMax",
+    "2010 Chevrolet Malibu 150000 miles 4500",
+]
+
+ROUTES = ('predict', 'batch', 'cars', 'mixed')
+
+
+def make_request(session, base_url, route, descriptions):
+    if route == 'predict':
+        response = session.post(f"{base_url}/predict", json={"description": next(descriptions)}, timeout=300)
+    elif route == 'batch':
+        response = session.post(f"{base_url}/predict/batch",
+                                json={"descriptions": [next(descriptions) for _ in range(16)]}, timeout=300)
+    else:
+        response = session.get(f"{base_url}/cars", params={"per_page": 20, "count": "cached"}, timeout=300)
+    response.raise_for_status()
+
+
+def run_level(base_url, route, concurrency, total_requests):
+    """Run total_requests spread over `concurrency` client threads"""
+    latencies = {}
+    errors = {}
+    lock = Lock()
+    remaining = [total_requests]
+
+    def client(index):
+        session = requests.Session()
+        descriptions = cycle(DESCRIPTIONS[index % len(DESCRIPTIONS):] + DESCRIPTIONS[:index % len(DESCRIPTIONS)])
+        # Mixed load: half the clients predict, half browse /cars
+        client_route = route if route != 'mixed' else ('predict' if index % 2 == 0 else 'cars')
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                make_request(session, base_url, client_route, descriptions)
+                failed = False
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.setdefault(client_route, []).append(elapsed)
+                if failed:
+                    errors[client_route] = errors.get(client_route, 0) + 1
+
+    start = time.perf_counter()
+    threads = [Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    result = {"concurrency": concurrency, "seconds": round(wall, 2), "routes": {}}
+    for name, values in latencies.items():
+        ms = np.array(values) * 1000
+        result["routes"][name] = {
+            "requests": len(values),
+            "errors": errors.get(name, 0),
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p90_ms": round(float(np.percentile(ms, 90)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1),
+            "max_ms": round(float(ms.max()), 1),
+            "requests_per_second": round(len(values) / wall, 1) if wall else 0.0,
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API latency at increasing concurrency")
+    parser.add_argument('--url', default=f"http://{config['ip']}:{config['port']}", help="Base URL of the API")
+    parser.add_argument('--route', choices=ROUTES, default='predict',
+                        help="predict, batch (16 descriptions), cars, or mixed (predict and cars at once)")
+    parser.add_argument('--concurrency', default='1,2,4,8,16,32', help="Comma-separated client counts")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument('--warmup', type=int, default=10, help="Untimed requests before the first level")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    if args.warmup:
+        run_level(base_url, args.route, 1, args.warmup)
+
+    report = {"url": base_url, "route": args.route, "levels": []}
+    for concurrency in levels:
+        result = run_level(base_url, args.route, concurrency, args.requests)
+        report["levels"].append(result)
+        if not args.json:
+            for name, s in result["routes"].items():
+                print(f"{concurrency:>4} clients  {name:<8} p50 {s['p50_ms']:>8.1f} ms  p99 {s['p99_ms']:>8.1f} ms  "
+                      f"{s['requests_per_second']:>7.1f} req/s  {s['errors']} errors")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# metrics.py
+#
+# In-process metrics rendered in the Prometheus text format, without a
+# client library. Each process (every gunicorn worker) keeps its own values
+# and labels them with worker=<pid>, so counters from different workers
+# never look like resets of one another.
+#
+# Under gunicorn a scrape reaches one worker at random. With share() every
+# worker also dumps its samples to a directory every few seconds, and
+# render() merges the other workers' dumps into its own, so each scrape
+# returns every worker's series.
+
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from threading import Lock, Thread
+
+# Seconds, from sub-millisecond regex work up to slow NER batches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def _format_families(families):
+    """Text format for (name, type, help, samples) families; samples are (name, labels, value)"""
+    lines = []
+    for name, kind, help, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample, labels, value in samples:
+            lines.append(f"{sample}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Histogram:
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._lock = Lock()
+        self._series = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self, const_labels):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        samples = []
+        for key, counts, total, count in sorted(series):
+            labels = dict(const_labels, **dict(zip(self.labelnames, key)))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return [(self.name, 'histogram', self.help, samples)]
+
+
+class Counter:
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self, const_labels):
+        with self._lock:
+            values = sorted(self._values.items())
+        samples = [
+            (self.name, dict(const_labels, **dict(zip(self.labelnames, key))), value)
+            for key, value in values
+        ]
+        return [(self.name, 'counter', self.help, samples)]
+
+
+class StatsGauges:
+    """Exposes the numeric entries of a stats() dict as gauges, read at scrape time"""
+
+    def __init__(self, prefix, help, stats):
+        self.prefix = prefix
+        self.help = help
+        self.stats = stats
+
+    def collect(self, const_labels):
+        stats = self.stats()
+        if not stats:
+            return []
+        families = []
+        for key, value in sorted(stats.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            families.append((name, 'gauge', f"{self.help}: {key}", [(name, dict(const_labels), value)]))
+        return families
+
+
+class Registry:
+
+    def __init__(self):
+        self.const_labels = {}
+        self._metrics = []
+        self._lock = Lock()
+
+        # Set by share(): where the workers of one gunicorn group swap samples
+        self.shared_dir = None
+        self.share_interval = 5.0
+        self._sharing_pid = None
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def stats_gauges(self, prefix, help, stats):
+        return self.register(StatsGauges(prefix, help, stats))
+
+    def collect(self):
+        """(name, type, help, samples) for every metric of this process"""
+        # The pid is read at collect time, so forked workers report their own
+        const_labels = dict(self.const_labels, worker=str(os.getpid()))
+        with self._lock:
+            metrics = list(self._metrics)
+        families = []
+        for metric in metrics:
+            families.extend(metric.collect(const_labels))
+        return families
+
+    def share(self, directory, interval=5.0):
+        """Swap samples with the other worker processes through directory"""
+        self.shared_dir = directory
+        self.share_interval = interval
+
+    def start_sharing(self):
+        """Start this process's dump thread (call in each worker, after the fork)"""
+        if self.shared_dir is None or self._sharing_pid == os.getpid():
+            return
+        self._sharing_pid = os.getpid()
+        Thread(target=self._share_loop, name="metrics-share", daemon=True).start()
+
+    def _share_loop(self):
+        while True:
+            try:
+                self._dump()
+            except Exception as e:
+                print(f"Writing shared metrics failed: {e}")
+            time.sleep(self.share_interval)
+
+    def _dump(self):
+        path = os.path.join(self.shared_dir, f"{os.getpid()}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.collect(), f)
+        os.replace(tmp_path, path)
+
+    def _shared_families(self):
+        """Families dumped by the other live workers; files of dead ones are removed"""
+        families = []
+        if self.shared_dir is None or not os.path.isdir(self.shared_dir):
+            return families
+        for name in os.listdir(self.shared_dir):
+            stem, ext = os.path.splitext(name)
+            if ext != ".json" or not stem.isdigit() or int(stem) == os.getpid():
+                continue
+            path = os.path.join(self.shared_dir, name)
+            if not _pid_alive(int(stem)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, "r") as f:
+                    families.extend(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return families
+
+    def render(self):
+        """This process's metrics plus, when shared, every other worker's latest dump"""
+        merged = {}
+        for name, kind, help, samples in self.collect() + self._shared_families():
+            family = merged.setdefault(name, (name, kind, help, []))
+            family[3].extend(samples)
+        return _format_families(merged.values())
+
+
+registry = Registry()
+
+# Prediction stages, observed once per call (a call may cover a batch)
+STAGE_SECONDS = registry.histogram(
+    'car_score_stage_seconds', "Time spent per prediction stage call", labelnames=('stage',)
+)
+BATCH_ROWS = registry.histogram(
+    'car_score_batch_rows', "Descriptions per scored batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1000)
+)
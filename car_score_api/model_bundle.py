@@ -0,0 +1,236 @@
+# model_bundle.py
+#
+# Everything CarScorePredictor needs in one versioned, memory-mappable file:
+# feature names, imputation means, input/output scaler parameters, the
+# encoding and the MLP weights. Replaces loading X_train.pkl (the whole
+# training matrix) for its column means, two pickled sklearn scalers, the
+# .pth file and two JSON files.
+#
+# Layout (safetensors-like): 8-byte magic, 8-byte little-endian header
+# length, a JSON header, then each array at a 64-byte aligned offset. Arrays
+# are np.memmap'd copy-on-write, so loading costs no reads up front and
+# worker processes share the same page-cache pages.
+#
+#   python model_bundle.py                 # build from the artifacts in model/
+#   python model_bundle.py --check         # print what an existing bundle holds
+
+import argparse
+import json
+import os
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+
+MAGIC = b"CARSCORE"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+BUNDLE_NAME = "car_model.bundle"
+
+# Files the bundle is built from; a newer one means the bundle is stale
+SOURCE_FILES = ['best_car_model.pth', 'scaler.pkl', 'model_scaler.pkl', 'model_features.json', 'X_train.pkl', 'encoding.json']
+
+
+class ScalerParams:
+    """Stands in for the fitted sklearn scalers, from their saved parameters"""
+
+    def __init__(self, center, scale):
+        self.center = np.asarray(center, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    @property
+    def mean_(self):
+        return self.center
+
+    @property
+    def scale_(self):
+        return self.scale
+
+    # Results keep the input dtype, like sklearn's
+    def transform(self, X):
+        X = np.asarray(X)
+        return ((X - self.center) / self.scale).astype(X.dtype, copy=False)
+
+    def inverse_transform(self, X):
+        X = np.asarray(X)
+        return (X * self.scale + self.center).astype(X.dtype, copy=False)
+
+
+class ModelBundle:
+
+    def __init__(self, metadata, arrays):
+        self.metadata = metadata
+        self.arrays = arrays
+
+    @property
+    def feature_names(self):
+        return self.metadata['feature_names']
+
+    @property
+    def encoding(self):
+        return self.metadata['encoding']
+
+    @property
+    def default_values(self):
+        return dict(zip(self.feature_names, self.arrays['impute_mean'].tolist()))
+
+    @property
+    def input_scaler(self):
+        return ScalerParams(self.arrays['input_mean'], self.arrays['input_scale'])
+
+    @property
+    def output_scaler(self):
+        return ScalerParams(self.arrays['output_center'], self.arrays['output_scale'])
+
+    def state_dict(self):
+        """MLP weights as tensors backed by the mapped file (no copy)"""
+        import torch
+        prefix = 'state.'
+        return {
+            name[len(prefix):]: torch.from_numpy(array)
+            for name, array in self.arrays.items() if name.startswith(prefix)
+        }
+
+
+def write_bundle(path, feature_names, impute_mean, input_mean, input_scale,
+                 output_center, output_scale, state_dict, encoding=None, extra=None):
+    """Write a bundle atomically; state_dict values may be tensors or arrays"""
+    arrays = {
+        'impute_mean': np.asarray(impute_mean, dtype=np.float64),
+        'input_mean': np.asarray(input_mean, dtype=np.float64),
+        'input_scale': np.asarray(input_scale, dtype=np.float64),
+        'output_center': np.asarray(output_center, dtype=np.float64).reshape(-1),
+        'output_scale': np.asarray(output_scale, dtype=np.float64).reshape(-1),
+    }
+    for name, value in state_dict.items():
+        value = value.detach().cpu().numpy() if hasattr(value, 'detach') else np.asarray(value)
+        # np.array rather than ascontiguousarray, which turns 0-d buffers into 1-d
+        arrays[f'state.{name}'] = np.array(value, order='C')
+
+    width = len(feature_names)
+    for name in ('impute_mean', 'input_mean', 'input_scale'):
+        if arrays[name].shape != (width,):
+            raise ValueError(f"{name} has shape {arrays[name].shape}, expected ({width},)")
+
+    metadata = {
+        'format_version': FORMAT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'feature_names': list(feature_names),
+        'encoding': encoding or {'encoding': 'onehot'},
+    }
+    metadata.update(extra or {})
+
+    # Offsets are relative to the start of the data section
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+
+    header = json.dumps({'metadata': metadata, 'arrays': entries}).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.write(b'\0' * (data_start + entries[name]['offset'] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_bundle(path):
+    """Map a bundle; arrays are copy-on-write views of the file"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        (header_length,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_length))
+
+    metadata = header['metadata']
+    if metadata.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format {metadata.get('format_version')} in {path}")
+
+    data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        shape = tuple(entry['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=entry['dtype'])
+            continue
+        arrays[name] = np.memmap(path, dtype=np.dtype(entry['dtype']), mode='c',
+                                 offset=data_start + entry['offset'], shape=shape)
+    return ModelBundle(metadata, arrays)
+
+
+def is_stale(model_dir, bundle_path):
+    """True if any source artifact was written after the bundle"""
+    bundle_mtime = os.path.getmtime(bundle_path)
+    return any(
+        os.path.getmtime(os.path.join(model_dir, name)) > bundle_mtime
+        for name in SOURCE_FILES if os.path.exists(os.path.join(model_dir, name))
+    )
+
+
+def bundle_from_artifacts(model_dir, path=None):
+    """Build a bundle from the notebook/train.py artifacts in model_dir"""
+    import joblib
+    import pandas as pd
+    import torch
+
+    with open(os.path.join(model_dir, 'model_features.json'), 'r') as f:
+        feature_names = json.load(f)
+    encoding = {'encoding': 'onehot'}
+    if os.path.exists(os.path.join(model_dir, 'encoding.json')):
+        with open(os.path.join(model_dir, 'encoding.json'), 'r') as f:
+            encoding = json.load(f)
+
+    input_scaler = joblib.load(os.path.join(model_dir, 'scaler.pkl'))
+    output_scaler = joblib.load(os.path.join(model_dir, 'model_scaler.pkl'))
+    impute_mean = pd.read_pickle(os.path.join(model_dir, 'X_train.pkl')).mean()[feature_names]
+    state_dict = torch.load(os.path.join(model_dir, 'best_car_model.pth'), weights_only=True)
+
+    input_mean = getattr(input_scaler, 'mean_', None)
+    output_center = getattr(output_scaler, 'center_', None)
+    output_scale = getattr(output_scaler, 'scale_', None)
+    return write_bundle(
+        path or os.path.join(model_dir, BUNDLE_NAME),
+        feature_names,
+        impute_mean.to_numpy(),
+        np.zeros(len(feature_names)) if input_mean is None else input_mean,
+        input_scaler.scale_,
+        np.zeros(1) if output_center is None else output_center,
+        np.ones(1) if output_scale is None else output_scale,
+        state_dict,
+        encoding=encoding,
+    )
+
+
+def main():
+    model_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model"))
+    parser = argparse.ArgumentParser(description="Build or inspect the CarScorePredictor model bundle")
+    parser.add_argument('--model-dir', default=model_dir)
+    parser.add_argument('--out', help=f"Bundle path (default <model-dir>/{BUNDLE_NAME})")
+    parser.add_argument('--check', action='store_true', help="Describe an existing bundle instead of building one")
+    args = parser.parse_args()
+
+    path = args.out or os.path.join(args.model_dir, BUNDLE_NAME)
+    if not args.check:
+        bundle_from_artifacts(args.model_dir, path)
+        print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.2f} MB)")
+
+    bundle = load_bundle(path)
+    print(json.dumps({
+        'created': bundle.metadata['created'],
+        'features': len(bundle.feature_names),
+        'encoding': bundle.encoding,
+        'arrays': {name: list(array.shape) for name, array in bundle.arrays.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# model_matcher.py
+
+import re
+
+# Words are compared case-insensitively on letters and digits only, so
+# "F-150" and "f 150" tokenize the same way. Letter/digit runs are not split:
+# "F150" is one token and does not match "F 150", as with the old \b regexes
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Marks a trie node that completes a catalog name
+_END = object()
+
+
+class ModelMatcher:
+    """Token trie over the make/model catalog, built once and reused.
+
+    find() walks the text once and returns the catalog name covering the
+    most words. Ties go to the earliest match in the text, and duplicate
+    names keep the first catalog entry, so results are deterministic even
+    when one model name is a prefix of another ("Acura Mdx" vs
+    "Acura Mdx Sport Hybrid").
+    """
+
+    def __init__(self, model_types):
+        self.trie = {}
+        for name in model_types:
+            tokens = TOKEN_RE.findall(name.lower())
+            if not tokens:
+                continue
+            node = self.trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node.setdefault(_END, name)
+
+    def find(self, text):
+        """Return the longest catalog name found in the text, or None"""
+        tokens = TOKEN_RE.findall(text.lower())
+        best, best_length = None, 0
+
+        for start in range(len(tokens)):
+            node = self.trie
+            end = start
+            while end < len(tokens) and tokens[end] in node:
+                node = node[tokens[end]]
+                end += 1
+                if _END in node and end - start > best_length:
+                    best, best_length = node[_END], end - start
+
+        return best
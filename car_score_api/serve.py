@@ -0,0 +1,188 @@
+# serve.py
+#
+# Production serving with gunicorn instead of the Flask dev server. Two
+# groups of worker processes run side by side, so slow predictions never
+# hold up /cars:
+#
+#   db         the public ip/port: /cars, /metadata and /health on threaded
+#              workers, /predict and /predict/batch relayed to the inference group
+#   inference  an internal port: the model is loaded once in the gunicorn
+#              master and forked, so the workers share its pages copy-on-write,
+#              each with its own torch thread budget
+#
+# Each group's workers share their metrics through a temporary directory, so
+# /metrics (db) and /metrics/inference return every worker's series.
+#
+#   python serve.py                                           # both groups
+#   python serve.py --role inference                          # one group, e.g. on its own host
+#   python serve.py --role db --inference-url http://10.0.0.5:5001
+
+import argparse
+import gc
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Thread
+
+from gunicorn.app.base import BaseApplication
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+from env.config import config
+
+ROLES = ('all', 'db', 'inference')
+
+DEFAULTS = {
+    'db_workers': 2,
+    'db_threads': 16,
+    'inference_workers': 2,
+    'inference_threads': 8,
+    'torch_threads': None,
+    'inference_host': '127.0.0.1',
+    'inference_port': None,
+    'timeout': 120,
+}
+
+
+def serving_config():
+    serving = dict(DEFAULTS)
+    serving.update(config.get('serving', {}))
+    if serving['inference_port'] is None:
+        serving['inference_port'] = int(config['port']) + 1
+    if serving['torch_threads'] is None:
+        # Split the cores between the inference workers instead of oversubscribing them
+        serving['torch_threads'] = max(1, (os.cpu_count() or 1) // serving['inference_workers'])
+    return serving
+
+
+def preload_pipelines(predictor):
+    """Load the NER weights in the master so every worker shares them"""
+    if predictor.ner_mode != 'ner':
+        return
+    try:
+        predictor.ner_pipeline
+    except Exception as e:
+        predictor.warmup_error = str(e)
+        print(f"Loading the NER pipeline failed: {e}")
+
+
+class ServerApp(BaseApplication):
+    """server.py's app under gunicorn, configured from a dict of settings"""
+
+    def __init__(self, role, options):
+        self.role = role
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Runs once in the master (preload_app), before the workers fork
+        os.environ['CAR_SCORE_ROLE'] = self.role
+        if self.role == 'inference':
+            import torch
+            # A started OpenMP pool does not survive fork; workers size their own
+            torch.set_num_threads(1)
+
+        import server
+        if self.role == 'inference':
+            preload_pipelines(server.predictor)
+            # Keep the collector from writing to (and so copying) the shared objects
+            gc.freeze()
+        return server.app
+
+
+def db_post_fork(arbiter, worker):
+    import server
+    server.registry.start_sharing()
+
+
+def inference_post_fork(torch_threads):
+    def post_fork(arbiter, worker):
+        import torch
+        import server
+        torch.set_num_threads(torch_threads)
+        server.registry.start_sharing()
+        if server.predictor.ner_mode == 'ner':
+            # The first forward pass in each process builds its thread pool
+            Thread(target=server.predictor.warm_up, name="predictor-warmup", daemon=True).start()
+    return post_fork
+
+
+def gunicorn_options(role, serving):
+    options = {
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': serving['timeout'],
+        'keepalive': 75,  # the db workers reuse connections to the inference workers
+    }
+    if role == 'db':
+        options.update({
+            'bind': f"{config['ip']}:{config['port']}",
+            'workers': serving['db_workers'],
+            'threads': serving['db_threads'],
+            'post_fork': db_post_fork,
+        })
+    else:
+        options.update({
+            'bind': f"{serving['inference_host']}:{serving['inference_port']}",
+            'workers': serving['inference_workers'],
+            'threads': serving['inference_threads'],
+            'post_fork': inference_post_fork(serving['torch_threads']),
+        })
+    return options
+
+
+def run_both(inference_url):
+    """Start each group in its own process and stop both if either exits"""
+    children = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), '--role', role, '--inference-url', inference_url])
+        for role in ('inference', 'db')
+    ]
+
+    def stop(signum=None, frame=None):
+        for child in children:
+            if child.poll() is None:
+                child.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while all(child.poll() is None for child in children):
+        time.sleep(1)
+    stop()
+    return max(child.wait() for child in children)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with gunicorn")
+    parser.add_argument('--role', choices=ROLES, default='all',
+                        help="all: both worker groups; db or inference: just one of them")
+    parser.add_argument('--inference-url', help="Where the db workers reach the inference workers "
+                                                "(default: the serving.inference_host/port config)")
+    args = parser.parse_args()
+
+    serving = serving_config()
+    inference_url = args.inference_url or f"http://{serving['inference_host']}:{serving['inference_port']}"
+    if args.role == 'all':
+        sys.exit(run_both(inference_url))
+
+    os.environ['CAR_SCORE_INFERENCE_URL'] = inference_url
+    metrics_dir = tempfile.mkdtemp(prefix=f"car_score_metrics_{args.role}_")
+    os.environ['CAR_SCORE_METRICS_DIR'] = metrics_dir
+    print(f"Starting the {args.role} workers: {serving[args.role + '_workers']} processes x "
+          f"{serving[args.role + '_threads']} threads"
+          + (f", {serving['torch_threads']} torch threads each" if args.role == 'inference' else ""))
+    try:
+        ServerApp(args.role, gunicorn_options(args.role, serving)).run()
+    finally:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
-from flask import Flask, request, jsonify
-from car_score_predictor import CarScorePredictor
+from flask import Flask, Response, g, request, jsonify
+from car_score_predictor import CarScorePredictor, NER_MODES
 from flask_cors import CORS
-import pymysql
+from batcher import MicroBatcher
+from db_pool import create_pool
+from metrics import registry
+from ttl_cache import TTLCache
+import data_version
+import base64
+import json
+import os
+import requests
 import sys
+import threading
+import time
 
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
@@ -11,27 +21,185 @@ from env.config import config
 app = Flask(__name__)
 CORS(app)
 
-predictor = CarScorePredictor()
+# Set by serve.py: 'all' serves every route (the dev server), 'db' serves the
+# database routes and forwards /predict* to the inference workers at
+# CAR_SCORE_INFERENCE_URL, 'inference' serves /predict* only
+ROLES = ('all', 'db', 'inference')
+ROLE = os.environ.get('CAR_SCORE_ROLE', 'all')
+if ROLE not in ROLES:
+    raise ValueError(f"CAR_SCORE_ROLE must be one of {ROLES}, got {ROLE!r}")
+INFERENCE_URL = os.environ.get('CAR_SCORE_INFERENCE_URL', '').rstrip('/')
+INFERENCE_TIMEOUT = 300
 
-def db_connection():
-    db_config = config['db_config']
+# Flask debug mode plus a print of every raw input and extracted car info; turn off in production
+DEBUG = config.get('debug', True)
 
-    return pymysql.connect(
-        host=db_config['host'],
-        user=db_config['user'],
-        password=db_config['password'],
-        database=db_config['database'],
+# Transformer models load lazily, optionally warmed up in the background.
+# Preloading inference workers warm up after the fork instead (threads don't survive it).
+predictor = None
+if ROLE != 'db':
+    predictor_config = config.get('predictor', {})
+    predictor = CarScorePredictor(
+        ner_mode=predictor_config.get('ner_mode', 'ner'),
+        warmup=predictor_config.get('warmup', True) and ROLE == 'all',
+        cache_size=predictor_config.get('cache_size', 10000),
+        cache_ttl=predictor_config.get('cache_ttl', 3600),
+        inference=predictor_config.get('inference', 'folded'),
+        quantize_ner=predictor_config.get('quantize_ner', False),
+        verbose=DEBUG,
     )
 
+# Concurrent /predict calls share one NER call and forward pass
+batcher = None
+if predictor is not None and predictor_config.get('batching', True):
+    batcher = MicroBatcher(
+        predictor.predict_batch,
+        max_batch_size=predictor_config.get('batch_max_size', 32),
+        max_wait_ms=predictor_config.get('batch_max_wait_ms', 5),
+        timeout=predictor_config.get('batch_timeout', 60),
+    )
+
+MAX_BATCH_SIZE = 1000
+
+# Shared by every route handler; connections open on first use, so after the fork
+db_pool = create_pool(config) if ROLE != 'inference' else None
+
+# One keep-alive session per thread for forwarding to the inference workers
+forward_local = threading.local()
+
+# /cars totals per filter signature, valid until the scraper writes again
+COUNT_MODES = ('cached', 'exact', 'estimate', 'none')
+count_cache = TTLCache(max_size=1024, ttl=600)
+
+# (data version, updated_at, metadata) for /metadata
+metadata_snapshot = None
+
+# Served at /metrics; prediction stage timings are recorded by the predictor itself.
+# serve.py gives each worker group a directory to merge its workers' metrics through.
+registry.const_labels['role'] = ROLE
+if os.environ.get('CAR_SCORE_METRICS_DIR'):
+    registry.share(os.environ['CAR_SCORE_METRICS_DIR'])
+REQUEST_SECONDS = registry.histogram(
+    'car_score_http_request_seconds', "Request latency by endpoint", labelnames=('endpoint', 'method')
+)
+REQUESTS = registry.counter(
+    'car_score_http_requests_total', "Requests by endpoint and status", labelnames=('endpoint', 'method', 'status')
+)
+DB_QUERY_SECONDS = registry.histogram(
+    'car_score_db_query_seconds', "Database query time, fetch included", labelnames=('route', 'query')
+)
+CARS_ROWS = registry.histogram(
+    'car_score_cars_rows_returned', "Cars per /cars response", buckets=(0, 1, 5, 10, 20, 50, 100, 200, 500)
+)
+if predictor is not None and predictor.cache is not None:
+    registry.stats_gauges('car_score_prediction_cache', "Prediction cache", predictor.cache.stats)
+if batcher is not None:
+    registry.stats_gauges('car_score_batcher', "Predict micro-batcher", batcher.stats)
+if db_pool is not None:
+    registry.stats_gauges('car_score_db_pool', "Database connection pool", db_pool.stats)
+    registry.stats_gauges('car_score_count_cache', "/cars count cache", count_cache.stats)
+
+def inference_session():
+    if getattr(forward_local, 'session', None) is None:
+        forward_local.session = requests.Session()
+    return forward_local.session
+
+def inference_request(method, path, body=None, timeout=INFERENCE_TIMEOUT):
+    return inference_session().request(
+        method, INFERENCE_URL + path, data=body,
+        headers={'Content-Type': 'application/json'}, timeout=timeout
+    )
+
+def forward_to_inference(method, path, body=None):
+    """Relay a request to the inference workers and pass their response back"""
+    try:
+        response = inference_request(method, path, body)
+    except Exception as e:
+        return jsonify({'error': f"Inference workers unavailable: {e}"}), 503
+    return Response(response.content, status=response.status_code,
+                    content_type=response.headers.get('Content-Type', 'application/json'))
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unmatched'
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint, method=request.method)
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@app.before_request
+def route_for_role():
+    # Inference workers have no database pool
+    if ROLE == 'inference' and request.endpoint in ('get_cars', 'get_metadata'):
+        return jsonify({'error': "Database routes are not served by the inference workers"}), 404
+
+@app.route('/health')
+def health():
+    if predictor is not None:
+        # Ready once the model is loaded; a missing NER pipeline loads on the next request
+        ready = True
+        body = {
+            "status": "ok",
+            "role": ROLE,
+            "ready": ready,
+            "ner_mode": predictor.ner_mode,
+            "ner_loaded": predictor.ner_loaded.is_set(),
+            "inference": predictor.inference,
+            "quantize_ner": predictor.quantize_ner,
+            "warmup_error": predictor.warmup_error,
+            "cache": predictor.cache.stats() if predictor.cache else None,
+            "batcher": batcher.stats() if batcher else None,
+        }
+    else:
+        # Ready when the inference workers are
+        try:
+            response = inference_request('GET', '/health', timeout=5)
+            ready, inference = response.status_code == 200, response.json()
+        except Exception as e:
+            ready, inference = False, {"error": str(e)}
+        body = {"status": "ok", "role": ROLE, "ready": ready, "inference": inference}
+
+    if db_pool is not None:
+        body["db_pool"] = db_pool.stats()
+        body["count_cache"] = count_cache.stats()
+    return jsonify(body), 200 if ready else 503
+
+def encode_cursor(value, car_id):
+    """Opaque keyset cursor for the last row of a page"""
+    raw = json.dumps({"v": value, "id": car_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    padded = token + '=' * (-len(token) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    value = data['v']
+    return (None if value is None else float(value)), int(data['id'])
+
 @app.route('/cars')
 def get_cars():
-    conn = None
     try:
 
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
         offset = (page - 1) * per_page
 
+        # Keyset paging: pass back the previous response's next_cursor
+        cursor_token = request.args.get('cursor')
+        if cursor_token:
+            try:
+                last_value, last_id = decode_cursor(cursor_token)
+            except Exception:
+                return jsonify({"error": "Invalid 'cursor'"}), 400
+
+        # Total count: cached (default), exact, estimate or none
+        count_mode = request.args.get('count', 'cached')
+        if count_mode not in COUNT_MODES:
+            return jsonify({"error": f"'count' must be one of {list(COUNT_MODES)}"}), 400
+
         min_price = int(request.args.get('min_price', 2000))
         max_price = int(request.args.get('max_price', 100000)) 
 
@@ -43,21 +211,13 @@ def get_cars():
         models = request.args.getlist('model')
         states = request.args.getlist('state')
 
-        conn = db_connection()
-        with conn.cursor() as cursor:
+        with db_pool.connection() as conn, conn.cursor() as cursor:
 
-            # Base query with price and mileage filter
+            # Base query with price and mileage filter on the indexed numeric columns
             base_query = """
                 FROM Cars
-                WHERE 
-                CAST(REPLACE(REPLACE(price, '$', ''), ',', '') AS UNSIGNED) BETWEEN %s AND %s
-                AND
-                CAST(
-                    REPLACE(
-                    REPLACE(mileage, ',', ''), -- remove commas
-                    ' mi.', ''                 -- remove " mi."
-                    ) AS UNSIGNED
-                ) BETWEEN %s AND %s
+                WHERE price_num BETWEEN %s AND %s
+                AND mileage_num BETWEEN %s AND %s
             """
             values = [min_price, max_price, min_mileage, max_mileage]
 
@@ -78,88 +238,212 @@ def get_cars():
                 values.extend(states)
 
             # Count total
-            cursor.execute(f"SELECT COUNT(*) {base_query}", values)
-            total = cursor.fetchone()[0]
-
-            # Paginated data
-            cursor.execute(
-                f"SELECT * {base_query} ORDER BY value ASC LIMIT %s OFFSET %s",
-                values + [per_page, offset]
-            )
+            total = None
+            if count_mode == 'exact':
+                with DB_QUERY_SECONDS.time(route='cars', query='count'):
+                    cursor.execute(f"SELECT COUNT(*) {base_query}", values)
+                    total = cursor.fetchone()[0]
+            elif count_mode == 'estimate':
+                # Optimizer row estimate, no scan
+                with DB_QUERY_SECONDS.time(route='cars', query='estimate'):
+                    cursor.execute(f"EXPLAIN SELECT * {base_query}", values)
+                    columns = [col[0] for col in cursor.description]
+                    total = sum(int(dict(zip(columns, row)).get('rows') or 0) for row in cursor.fetchall())
+            elif count_mode == 'cached':
+                # Cached per filter signature until the scraper bumps the data version
+                with DB_QUERY_SECONDS.time(route='cars', query='data_version'):
+                    version, _ = data_version.read(cursor)
+                signature = tuple(values[:4]) + (tuple(sorted(makes)), tuple(sorted(models)), tuple(sorted(states)))
+                cached = count_cache.get(signature) if version is not None else None
+                if cached is not None and cached[0] == version:
+                    total = cached[1]
+                else:
+                    with DB_QUERY_SECONDS.time(route='cars', query='count'):
+                        cursor.execute(f"SELECT COUNT(*) {base_query}", values)
+                        total = cursor.fetchone()[0]
+                    if version is not None:
+                        count_cache.put(signature, (version, total))
+
+            # Paginated data, one extra row to know whether another page exists
+            page_start = time.perf_counter()
+            if cursor_token:
+                # NULL values sort first in ascending order
+                if last_value is None:
+                    seek = " AND (value IS NOT NULL OR id > %s)"
+                    seek_values = [last_id]
+                else:
+                    # value is a FLOAT column, so compare at FLOAT precision
+                    seek = " AND (value > CAST(%s AS FLOAT) OR (value = CAST(%s AS FLOAT) AND id > %s))"
+                    seek_values = [last_value, last_value, last_id]
+                cursor.execute(
+                    f"SELECT * {base_query}{seek} ORDER BY value ASC, id ASC LIMIT %s",
+                    values + seek_values + [per_page + 1]
+                )
+            else:
+                cursor.execute(
+                    f"SELECT * {base_query} ORDER BY value ASC, id ASC LIMIT %s OFFSET %s",
+                    values + [per_page + 1, offset]
+                )
             
             # Convert to dictionaries
             columns = [col[0] for col in cursor.description]
             cars = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            DB_QUERY_SECONDS.observe(time.perf_counter() - page_start, route='cars', query='page')
+
+        CARS_ROWS.observe(min(len(cars), per_page))
+
+        next_cursor = None
+        if len(cars) > per_page:
+            cars = cars[:per_page]
+            next_cursor = encode_cursor(cars[-1]['value'], cars[-1]['id'])
 
         return jsonify({
             "cars": cars,
             "page": page,
             "per_page": per_page,
-            "total": total
+            "total": total,
+            "next_cursor": next_cursor
         })
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
+
+def build_metadata(cursor):
+    """Makes, states and models per make from one DISTINCT scan"""
+    cursor.execute("SELECT DISTINCT make, model, state FROM Cars")
+
+    makes, states = set(), set()
+    models_by_make = {}
+    for make, model, state in cursor.fetchall():
+        if make:
+            makes.add(make)
+            if model:
+                models_by_make.setdefault(make, set()).add(model)
+        if state:
+            states.add(state)
+
+    return {
+        "makes": sorted(makes),
+        "states": sorted(states),
+        "models_by_make": {make: sorted(models) for make, models in models_by_make.items()}
+    }
 
 @app.route('/metadata')
 def get_metadata():
-    conn = None
+    global metadata_snapshot
     try:
-        conn = db_connection()
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT DISTINCT make FROM Cars WHERE make IS NOT NULL AND make != ''")
-            makes = sorted([row[0] for row in cursor.fetchall()])
+        with db_pool.connection() as conn, conn.cursor() as cursor:
+            with DB_QUERY_SECONDS.time(route='metadata', query='data_version'):
+                version, updated_at = data_version.read(cursor)
 
-            cursor.execute("SELECT DISTINCT state FROM Cars WHERE state IS NOT NULL AND state != ''")
-            states = sorted([row[0] for row in cursor.fetchall()])
+            # Rebuild only when the scraper has written since the last snapshot
+            snapshot = metadata_snapshot
+            if version is None or snapshot is None or snapshot[0] != version:
+                with DB_QUERY_SECONDS.time(route='metadata', query='distinct'):
+                    metadata = build_metadata(cursor)
+                snapshot = (version, updated_at, metadata)
+                if version is not None:
+                    metadata_snapshot = snapshot
 
-            # Fetch make/model pairs
-            cursor.execute("""
-                SELECT DISTINCT make, model
-                FROM Cars
-                WHERE make IS NOT NULL AND make != ''
-                  AND model IS NOT NULL AND model != ''
-            """)
-            models_by_make = {}
-            for make, model in cursor.fetchall():
-                if make not in models_by_make:
-                    models_by_make[make] = []
-                if model not in models_by_make[make]:
-                    models_by_make[make].append(model)
-
-        return jsonify({
-            "makes": makes,
-            "states": states,
-            "models_by_make": models_by_make
-        })
+        version, updated_at, metadata = snapshot
+        response = jsonify(metadata)
+        if version is not None:
+            # Clients revalidate and get a 304 while nothing has changed
+            response.set_etag(f"metadata-{version}")
+            response.last_modified = updated_at
+            response.cache_control.no_cache = True
+            response = response.make_conditional(request)
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
 
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    if predictor is None:
+        return forward_to_inference('POST', '/predict', request.get_data())
     try:
         data = request.get_json(force=True)  
         text_input = data.get('description', '').strip()
         if not text_input:
             return jsonify({'error': "Missing or empty 'description' field"}), 400
 
-        print(f"Raw Input: {text_input}")
-        score = predictor.predict_score(text_input)
+        mode = data.get('mode')
+        if mode is not None and mode not in NER_MODES:
+            return jsonify({'error': f"'mode' must be one of {list(NER_MODES)}"}), 400
+
+        if DEBUG:
+            print(f"Raw Input: {text_input}")
+        if batcher is None:
+            score = predictor.predict_score(text_input, mode=mode)
+        else:
+            try:
+                result = batcher.submit(text_input, mode=mode)
+            except TimeoutError as e:
+                return jsonify({'error': str(e)}), 503
+            if 'error' in result:
+                return jsonify(result), 500
+            score = result['score']
         return jsonify({'score': round(float(score), 2)})
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    if predictor is None:
+        return forward_to_inference('POST', '/predict/batch', request.get_data())
+    try:
+        data = request.get_json(force=True)
+        descriptions = data.get('descriptions')
+        if not isinstance(descriptions, list) or not descriptions:
+            return jsonify({'error': "Missing or empty 'descriptions' list"}), 400
+        if len(descriptions) > MAX_BATCH_SIZE:
+            return jsonify({'error': f"At most {MAX_BATCH_SIZE} descriptions per batch"}), 400
+
+        mode = data.get('mode')
+        if mode is not None and mode not in NER_MODES:
+            return jsonify({'error': f"'mode' must be one of {list(NER_MODES)}"}), 400
+
+        # Validate per item so one bad entry does not reject the whole batch
+        results = [None] * len(descriptions)
+        texts, indices = [], []
+        for i, description in enumerate(descriptions):
+            text_input = description.strip() if isinstance(description, str) else ''
+            if not text_input:
+                results[i] = {'error': "Missing or empty description"}
+            else:
+                texts.append(text_input)
+                indices.append(i)
+
+        if texts:
+            for i, result in zip(indices, predictor.predict_batch(texts, mode=mode)):
+                if 'score' in result:
+                    result = {'score': round(result['score'], 2)}
+                results[i] = result
+
+        return jsonify({'results': results})
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text format for every worker of this group (this process only without serve.py)"""
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/metrics/inference')
+def inference_metrics():
+    """The inference workers' metrics, relayed so one public port serves both groups"""
+    if predictor is not None:
+        return metrics()
+    return forward_to_inference('GET', '/metrics')
+
 if __name__ == "__main__":
-    app.run(host=f"{config['ip']}", debug=True, port=f"{config['port']}")
+    # Development server; see serve.py for multi-process serving
+    app.run(host=f"{config['ip']}", debug=DEBUG, port=f"{config['port']}")
 
 
 # config['host'] laptop
\ No newline at end of file
@@ -5,8 +5,56 @@ config = {
         'password': '',
         'database': ''        
     },
+    'db_pool': {
+        'max_size': 10,              # connections open at once
+        'max_idle_time': 300,        # seconds before an idle connection is recycled
+        'checkout_timeout': 5,       # seconds to wait for a free connection
+        'health_check_interval': 30  # ping connections idle longer than this
+    },
     'ip': '',
-    'port': ''
+    'port': '',
+    'debug': True,  # Flask debug mode and per-request prints of the input; False in production
+    'predictor': {
+        'ner_mode': 'ner',        # 'ner' or 'regex' (skip the BERT NER model)
+        'warmup': True,           # load the NER model in the background at startup
+        'cache_size': 10000,      # cached predictions (0 disables the cache)
+        'cache_ttl': 3600,        # seconds before a cached prediction expires
+        'inference': 'folded',    # 'eager', 'folded' (BatchNorm folded away) or 'torchscript'
+        'quantize_ner': False,    # dynamic int8 NER model on CPU (see inference_report.py for the accuracy cost)
+        'batching': True,         # coalesce concurrent /predict calls into one batch
+        'batch_max_size': 32,     # run a batch once this many requests are queued...
+        'batch_max_wait_ms': 5,   # ...or this long after the first one arrived
+        'batch_timeout': 60       # seconds a /predict waits for its batch before returning 503
+    },
+    'serving': {
+        'db_workers': 2,               # serve.py processes for /cars, /metadata and /health
+        'db_threads': 16,              # threads per db worker (mostly waiting on MySQL)
+        'inference_workers': 2,        # serve.py processes for /predict, sharing the preloaded model
+        'inference_threads': 8,        # request threads per inference worker (they wait on the /predict batcher)
+        'torch_threads': None,         # torch intra-op threads per inference worker (None = cores // inference_workers)
+        'inference_host': '127.0.0.1', # internal address of the inference workers
+        'inference_port': None,        # internal port of the inference workers (None = port + 1)
+        'timeout': 120                 # seconds before gunicorn restarts a stuck worker
+    },
+    'scraper': {
+        'scoring': 'http',         # 'http' (use the API) or 'inprocess' (load the model in the scraper)
+        'ner_mode': 'ner',         # extraction mode used when scoring scraped listings
+        'requests_per_second': 4,  # politeness budget shared by all scraper workers
+        'max_retries': 3,          # retries with exponential backoff per page
+        'parser': 'auto',          # 'auto', 'selectolax', 'lxml' or 'bs4'
+        'save_html_dir': None,     # save fetched pages here (fixtures for benchmark_parser.py)
+        'stale_days': 7,           # incremental runs delete listings not seen for this many days
+        'bulk_method': 'values',   # 'values' (multi-row INSERTs) or 'load_data' (LOAD DATA LOCAL INFILE, needs local_infile on the server)
+        'bulk_chunk_rows': 1000,   # rows per multi-row INSERT statement
+        'bulk_commit_rows': 20000, # rows per transaction from the writer thread
+        'fetch_workers': 15,       # pipeline threads waiting on page downloads
+        'parse_workers': 2,        # pipeline threads parsing HTML
+        'score_workers': 1,        # pipeline threads scoring listings
+        'score_batch_pages': 16,   # pages scored together in one batch
+        'queue_size': 32,          # bound on each stage's queue; keeps memory flat
+        'output': 'auto',          # 'parquet', 'arrow' or 'csv' (cars_data.csv); 'auto' = parquet if pyarrow is installed
+        'output_dir': None         # where parquet/arrow runs go (default scripts/listings)
+    }
 }
 
 # Add your database and server details, then rename to config.py
\ No newline at end of file
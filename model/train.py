@@ -0,0 +1,443 @@
+# train.py
+#
+# Scriptable version of the training in cars.ipynb, for unattended retraining
+# on large scraped datasets. Every step is a column operation: the synthetic
+# features use one seeded NumPy generator, enhanced_scoring is evaluated with
+# np.where over whole columns and the Condition/Model/Dealer one-hot block is
+# a scipy sparse matrix, densified one minibatch at a time.
+#
+# Writes the same artifacts as the notebook: scaler.pkl, model_scaler.pkl,
+# model_features.json, X_train.pkl and best_car_model.pth, plus encoding.json
+# recording whether Model/Dealer are one-hot or hashed (--encoding hashed),
+# and car_model.bundle, which holds all of it in one file the API maps at
+# startup (see car_score_api/model_bundle.py).
+#
+#   python train.py --data training_cars_data.csv
+#   python train.py --data ../scripts/listings/run=20250101T000000 --out /tmp/model
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import torch
+from sklearn.feature_selection import SelectPercentile, f_regression
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import RobustScaler, StandardScaler
+from torch import nn, optim
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent / "car_score_api"))
+sys.path.append(str(Path(__file__).parent.parent / "scripts"))
+from car_score_predictor import ImprovedMLP
+from feature_encoder import ENCODINGS, HASHED_FIELDS, hashed_feature_names, hashed_features
+from model_bundle import BUNDLE_NAME, write_bundle
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Numerical columns in the order the notebook's DataFrame has them
+NUMERIC_COLUMNS = ['Mileage', 'Price', 'Monthly Payment', 'Year', 'Accidents', 'Owners', 'Usage',
+                   'Age', 'MilesPerYear', 'PricePerMile']
+ONE_HOT_COLUMNS = ['Condition', 'Model', 'Dealer']
+REQUIRED_COLUMNS = ['Monthly Payment', 'Mileage', 'Price', 'Year', 'Score']
+
+# enhanced_scoring constants
+MEDIAN_PRICE = 25000  # median price baseline
+MAX_MILEAGE = 250000
+MAX_AGE = 30
+
+# Above this many cells X_train.pkl holds only the training means, which is
+# all CarScorePredictor reads from it
+MAX_DENSE_X_TRAIN_CELLS = 50_000_000
+
+
+def load_listings(path):
+    """Training CSV (notebook layout) or a scraper Parquet/Arrow run, as raw columns"""
+    if os.path.isdir(path) or path.endswith(('.parquet', '.arrow')):
+        from columnar_sink import read_listings
+        df = read_listings(path).to_pandas()
+        # Columnar runs already hold parsed ints
+        return pd.DataFrame({
+            'Condition': df['condition'],
+            'Mileage': df['mileage'],
+            'Price': df['price'],
+            'Monthly Payment': df['monthly_payment'],
+            'Dealer': df['dealer'],
+            'Year': df['year'],
+            'Model': df['modelTitle'],
+        })
+
+    df = pd.read_csv(path)
+    if 'Car Model' in df.columns:
+        df[['Year', 'Model']] = df['Car Model'].str.extract(r'(\d{4})\s(.*)')
+        df = df.drop(columns=['Car Model'])
+    return df.rename(columns={'Price (USD)': 'Price', 'Dealer Name': 'Dealer'})
+
+
+def clean(df):
+    df = df.copy()
+
+    # Standardize all matching rows to 'Certified', then fold the junk values into 'Other'
+    condition = df['Condition'].astype(object)
+    certified = condition.astype(str).str.lower().str.contains('certified', regex=False)
+    condition = condition.where(~certified, 'Certified')
+    df['Condition'] = condition.replace(['Prequalify now', 'stock_type', 'New & Used', np.nan], 'Other')
+
+    # Digits only, NaN where there are none
+    for column in ['Monthly Payment', 'Mileage', 'Price', 'Year']:
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].astype(str).str.replace(r'\D', '', regex=True)
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype(float)
+
+    # Set empty Mileage values to 0
+    df['Mileage'] = df['Mileage'].fillna(0)
+    return df
+
+
+def add_synthetic_features(df, rng):
+    """Accidents / Owners / Usage drawn with the notebook's weights, from one seeded generator"""
+    n = len(df)
+    df['Accidents'] = rng.choice([1, 0], size=n, p=[0.3, 0.7])  # 1 = accident, 0 = no accident
+    owner_weights = np.array([40, 40, 30, 20, 10], dtype=float)
+    df['Owners'] = rng.choice([0, 1, 2, 3, 4], size=n, p=owner_weights / owner_weights.sum())
+    df['Usage'] = rng.choice([1, 0], size=n, p=[0.8, 0.2])  # 1 = personal use, 0 = not personal
+    return df
+
+
+def add_engineered_features(df, current_year):
+    df['Age'] = current_year - df['Year']
+    df['MilesPerYear'] = df['Mileage'] / (df['Age'] + 1)
+    df['PricePerMile'] = df['Price'] / (df['Mileage'] + 1)
+    return df
+
+
+def enhanced_score(df, current_year):
+    """The notebook's enhanced_scoring, over whole columns"""
+    year = df['Year'].to_numpy(dtype=float)
+    mileage = df['Mileage'].to_numpy(dtype=float)
+    price = df['Price'].to_numpy(dtype=float)
+    payment = df['Monthly Payment'].to_numpy(dtype=float)
+    condition = df['Condition'].to_numpy(dtype=object)
+    accidents = df['Accidents'].to_numpy()
+    owners = df['Owners'].to_numpy()
+    usage = df['Usage'].to_numpy()
+
+    # avoid negative age if year is in future
+    age = np.maximum(current_year - year, 0)
+
+    # Price, else estimate the full price from 5 years of payments
+    price_for_score = np.where(np.isnan(price), payment * 60, price)
+
+    clamped_mileage = np.minimum(mileage, MAX_MILEAGE)
+    clamped_age = np.minimum(age, MAX_AGE)
+
+    # Scores (log scale for price, power scale for others)
+    price_score = np.log1p(price_for_score / MEDIAN_PRICE) * 100
+    mileage_score = 100 * ((clamped_mileage / MAX_MILEAGE) ** 0.8)
+    age_score = 100 * ((clamped_age / MAX_AGE) ** 0.7)
+
+    score = (0.55 * price_score) + (0.35 * mileage_score) + (0.10 * age_score)
+
+    # Condition adjustment; a penalty for unknown condition
+    score += np.select(
+        [condition == 'New', condition == 'Certified', condition == 'Used'],
+        [-20, -15, 0],
+        default=5,
+    )
+
+    # Accidents, owners and commercial usage penalties
+    score += np.where(accidents == 1, 10, np.where(accidents > 1, 15, 0))
+    score += np.where(owners == 2, 8, np.where(owners > 2, 8 + 3 * (owners - 2), 0))
+    score += np.where(usage == 0, 15 * (1 + clamped_age / MAX_AGE), 0)
+
+    # Mileage per year adjustment
+    miles_per_year = mileage / np.where(age > 0, age, 1)
+    score += np.where(miles_per_year < 7500, -5, np.where(miles_per_year > 15000, 10, 0))
+
+    # Missing essentials have no score
+    score[np.isnan(mileage) | np.isnan(year) | np.isnan(price_for_score)] = np.nan
+    return score
+
+
+def one_hot(df, columns):
+    """Sparse equivalent of pd.get_dummies(df, columns=columns): matrix and column names"""
+    blocks = []
+    names = []
+    for column in columns:
+        categorical = pd.Categorical(df[column])
+        codes = categorical.codes
+        present = codes >= 0  # NaN encodes to an all-zero row, as in get_dummies
+        rows = np.flatnonzero(present)
+        blocks.append(sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, codes[present])),
+            shape=(len(df), len(categorical.categories)),
+        ))
+        names.extend(f"{column}_{category}" for category in categorical.categories)
+    return sp.hstack(blocks, format='csr'), names
+
+
+def hashed(df, column, buckets):
+    """Feature-hashed block for one column: each distinct value is hashed once"""
+    categorical = pd.Categorical(df[column])
+    rows, columns, values = [], [], []
+    for code, category in enumerate(categorical.categories):
+        for bucket, weight in hashed_features(column, category, buckets).items():
+            rows.append(code)
+            columns.append(bucket)
+            values.append(weight)
+    by_category = sp.csr_matrix((values, (rows, columns)), shape=(len(categorical.categories), buckets), dtype=np.float32)
+
+    codes = categorical.codes
+    present = np.flatnonzero(codes >= 0)
+    indicator = sp.csr_matrix(
+        (np.ones(len(present), dtype=np.float32), (present, codes[present])),
+        shape=(len(df), len(categorical.categories)),
+    )
+    return indicator @ by_category, hashed_feature_names(column, buckets)
+
+
+def build_dataset(df, rng, current_year, encoding='onehot', hash_buckets=4096):
+    """Feature matrix (CSR), feature names and target, rows without a score dropped"""
+    df = clean(df)
+    df = add_synthetic_features(df, rng)
+    df = add_engineered_features(df, current_year)
+    df['Score'] = enhanced_score(df, current_year)
+
+    # Categories come from every row, as the notebook one-hot encodes before dropping
+    if encoding == 'hashed':
+        one_hot_columns = [column for column in ONE_HOT_COLUMNS if column not in HASHED_FIELDS]
+        blocks = [one_hot(df, one_hot_columns)] + [hashed(df, column, hash_buckets) for column in HASHED_FIELDS]
+        dummies = sp.hstack([block for block, _ in blocks], format='csr')
+        dummy_names = [name for _, names in blocks for name in names]
+    else:
+        dummies, dummy_names = one_hot(df, ONE_HOT_COLUMNS)
+    keep = np.flatnonzero(df[REQUIRED_COLUMNS].notna().all(axis=1).to_numpy())
+    df = df.iloc[keep]
+
+    numeric = sp.csr_matrix(df[NUMERIC_COLUMNS].to_numpy(dtype=np.float64))
+    X = sp.hstack([numeric, dummies[keep]], format='csr')
+    return X, NUMERIC_COLUMNS + dummy_names, df['Score'].to_numpy(dtype=np.float64)
+
+
+def fit_scaler(X):
+    """StandardScaler fitted on sparse X, with the centering a dense fit would use"""
+    scaler = StandardScaler(with_mean=False).fit(X)
+    # mean_ is computed either way; enabling it makes transform() match the notebook's scaler
+    scaler.with_mean = True
+    return scaler
+
+
+def dense_batch(X, rows, mean, inv_scale):
+    return torch.from_numpy(((X[rows].toarray() - mean) * inv_scale).astype(np.float32))
+
+
+def predict(model, X, mean, inv_scale, batch_size=4096):
+    model.eval()
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, X.shape[0], batch_size):
+            rows = np.arange(start, min(start + batch_size, X.shape[0]))
+            outputs.append(model(dense_batch(X, rows, mean, inv_scale)).numpy())
+    return np.concatenate(outputs) if outputs else np.empty((0, 1), dtype=np.float32)
+
+
+def write_json(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def save_atomic(save, path):
+    # An API starting up while training runs must never load a half-written file
+    tmp_path = path + ".tmp"
+    save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def train(data, out_dir=MODEL_DIR, seed=42, epochs=200, batch_size=64, lr=0.0001, patience=100,
+          percentile=50, current_year=None, xgboost=False, encoding='onehot', hash_buckets=4096):
+    if encoding not in ENCODINGS:
+        raise ValueError(f"encoding must be one of {ENCODINGS}, got {encoding!r}")
+    if epochs < 1:
+        raise ValueError(f"epochs must be at least 1, got {epochs}")
+    started = time.perf_counter()
+    current_year = current_year or datetime.now().year
+    rng = np.random.default_rng(seed)
+    torch.manual_seed(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    X, feature_names, y = build_dataset(load_listings(data), rng, current_year, encoding, hash_buckets)
+    print(f"{X.shape[0]} rows, {X.shape[1]} features ({X.nnz} non-zeros) in {time.perf_counter() - started:.1f}s")
+
+    # Feature selection (keep the top `percentile` percent by F-score); hash
+    # buckets are kept whole so the input width stays fixed
+    hashed_names = set()
+    if encoding == 'hashed':
+        hashed_names = {name for field in HASHED_FIELDS for name in hashed_feature_names(field, hash_buckets)}
+    hashed_columns = np.array([i for i, name in enumerate(feature_names) if name in hashed_names], dtype=np.intp)
+    candidates = np.setdiff1d(np.arange(X.shape[1]), hashed_columns)
+    selector = SelectPercentile(f_regression, percentile=percentile).fit(X[:, candidates], y)
+    selected = np.concatenate([candidates[selector.get_support(indices=True)], hashed_columns])
+    X_selected = X[:, selected].tocsr()
+    model_features = [feature_names[i] for i in selected]
+    print(f"Selected {len(model_features)} features")
+
+    encoding_info = {'encoding': encoding}
+    if encoding == 'hashed':
+        encoding_info['hash_buckets'] = {field: hash_buckets for field in HASHED_FIELDS}
+
+    # Normalize features; X stays sparse and is centered batch by batch
+    scaler = fit_scaler(X_selected)
+    mean = scaler.mean_
+    inv_scale = 1.0 / scaler.scale_
+
+    # Train-test split
+    train_rows, test_rows = train_test_split(np.arange(X_selected.shape[0]), test_size=0.2, random_state=42)
+    X_train, X_test = X_selected[train_rows], X_selected[test_rows]
+    y_train, y_test = y[train_rows].reshape(-1, 1), y[test_rows].reshape(-1, 1)
+
+    # X_train values (CarScorePredictor uses their means for imputation)
+    if X_train.shape[0] * X_train.shape[1] <= MAX_DENSE_X_TRAIN_CELLS:
+        X_train_df = pd.DataFrame((X_train.toarray() - mean) * inv_scale, columns=model_features)
+    else:
+        X_train_df = pd.DataFrame([(np.asarray(X_train.mean(axis=0)).ravel() - mean) * inv_scale], columns=model_features)
+        print("X_train.pkl holds the training means only (too large to store densely)")
+
+    if xgboost:
+        from xgboost import XGBRegressor
+        # Trees don't care about the scaling, so the sparse matrix goes in as is
+        xgb = XGBRegressor(n_estimators=1000, learning_rate=0.01, early_stopping_rounds=50, random_state=42)
+        xgb.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
+        xgb_pred = xgb.predict(X_test)
+        print(f"XGBoost MSE: {mean_squared_error(y_test, xgb_pred):.2f}  "
+              f"R²: {r2_score(y_test, xgb_pred):.4f}  MAE: {mean_absolute_error(y_test, xgb_pred):.2f}")
+
+    # Scale target
+    y_scaler = RobustScaler()
+    y_train_scaled = y_scaler.fit_transform(y_train).astype(np.float32)
+    y_test_scaled = y_scaler.transform(y_test).astype(np.float32)
+
+    model = ImprovedMLP(len(model_features))
+    criterion = nn.SmoothL1Loss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    y_train_tensor = torch.from_numpy(y_train_scaled)
+    y_test_tensor = torch.from_numpy(y_test_scaled)
+    model_path = os.path.join(out_dir, 'best_car_model.pth')
+
+    best_loss = float('inf')
+    best_state = None
+    no_improve = 0
+
+    for epoch in range(epochs):
+        model.train()
+        running_loss = 0.0
+        order = rng.permutation(X_train.shape[0])
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            if len(rows) < 2:
+                continue  # BatchNorm needs more than one row in training mode
+            batch_X = dense_batch(X_train, rows, mean, inv_scale)
+            batch_y = y_train_tensor[rows]
+            optimizer.zero_grad()
+            loss = criterion(model(batch_X), batch_y)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+            optimizer.step()
+            running_loss += loss.item() * len(rows)
+        epoch_loss = running_loss / X_train.shape[0]
+
+        val_loss = criterion(torch.from_numpy(predict(model, X_test, mean, inv_scale)), y_test_tensor).item()
+
+        if val_loss < best_loss:
+            best_loss = val_loss
+            no_improve = 0
+            best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+        else:
+            no_improve += 1
+            if no_improve >= patience:
+                print(f"Early stopping at epoch {epoch+1}")
+                break
+
+        if (epoch + 1) % 10 == 0:
+            print(f"Epoch {epoch+1}: Train Loss: {epoch_loss:.4f}, Val Loss: {val_loss:.4f}")
+
+    if best_state is None:
+        raise RuntimeError("Training diverged: no epoch produced a finite validation loss")
+
+    # Nothing is written until training succeeds, so a failed run leaves the old artifacts as a set
+    save_atomic(lambda p: write_json(model_features, p), os.path.join(out_dir, 'model_features.json'))
+    save_atomic(lambda p: write_json(encoding_info, p), os.path.join(out_dir, 'encoding.json'))
+    save_atomic(lambda p: joblib.dump(scaler, p), os.path.join(out_dir, 'scaler.pkl'))
+    save_atomic(lambda p: X_train_df.to_pickle(p), os.path.join(out_dir, 'X_train.pkl'))
+    save_atomic(lambda p: joblib.dump(y_scaler, p), os.path.join(out_dir, 'model_scaler.pkl'))
+
+    # Load best model
+    model.load_state_dict(best_state)
+    save_atomic(lambda p: torch.save(best_state, p), model_path)
+
+    # Written last so its mtime marks it current against the files above
+    write_bundle(
+        os.path.join(out_dir, BUNDLE_NAME), model_features, X_train_df.mean().to_numpy(),
+        scaler.mean_, scaler.scale_, y_scaler.center_, y_scaler.scale_, best_state,
+        encoding=encoding_info,
+    )
+
+    # Evaluation
+    preds_rescaled = y_scaler.inverse_transform(predict(model, X_test, mean, inv_scale))
+    tolerance = 5
+    metrics = {
+        'rows': int(X.shape[0]),
+        'features': len(model_features),
+        'mse': float(mean_squared_error(y_test, preds_rescaled)),
+        'r2': float(r2_score(y_test, preds_rescaled)),
+        'mae': float(mean_absolute_error(y_test, preds_rescaled)),
+        f'accuracy_within_{tolerance}': float(np.mean(np.abs(y_test - preds_rescaled) <= tolerance) * 100),
+        'seconds': round(time.perf_counter() - started, 1),
+    }
+    print("\nFinal Evaluation:")
+    print(f"Test MSE: {metrics['mse']:.2f}")
+    print(f"Test R²: {metrics['r2']:.4f}")
+    print(f"Test MAE: {metrics['mae']:.2f}")
+    print(f"Accuracy (within ±{tolerance}): {metrics[f'accuracy_within_{tolerance}']:.2f}%")
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the car score model and write its artifacts")
+    parser.add_argument('--data', default=os.path.join(MODEL_DIR, 'training_cars_data.csv'),
+                        help="Training CSV, or a scraper Parquet/Arrow run directory or file")
+    parser.add_argument('--out', default=MODEL_DIR, help="Directory for the artifacts")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--epochs', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--lr', type=float, default=0.0001)
+    parser.add_argument('--patience', type=int, default=100)
+    parser.add_argument('--percentile', type=float, default=50, help="SelectPercentile percentile to keep")
+    parser.add_argument('--current-year', type=int, help="Year used for Age (default: this year)")
+    parser.add_argument('--encoding', choices=ENCODINGS, default='onehot',
+                        help="onehot: a column per Model/Dealer value; hashed: a fixed number of buckets")
+    parser.add_argument('--hash-buckets', type=int, default=4096, help="Buckets per hashed field")
+    parser.add_argument('--xgboost', action='store_true', help="Also print the XGBoost benchmark")
+    parser.add_argument('--json', action='store_true', help="Print the final metrics as JSON")
+    args = parser.parse_args()
+    if args.epochs < 1:
+        parser.error("--epochs must be at least 1")
+
+    metrics = train(
+        args.data, out_dir=args.out, seed=args.seed, epochs=args.epochs, batch_size=args.batch_size,
+        lr=args.lr, patience=args.patience, percentile=args.percentile,
+        current_year=args.current_year, xgboost=args.xgboost,
+        encoding=args.encoding, hash_buckets=args.hash_buckets,
+    )
+    if args.json:
+        print(json.dumps(metrics, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmark_parser.py
+#
+# Compares the listing parser backends over saved results pages: pages per
+# second, peak memory and whether each backend's output matches bs4.
+# Save fixtures by setting scraper.save_html_dir in the config for a run.
+#
+#   python benchmark_parser.py --fixtures fixtures --repeat 5
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import time
+import tracemalloc
+
+from listing_parser import available_backends, parse_listings
+
+
+def comparable(records):
+    # The timestamp is taken at parse time, so leave it out
+    return [{k: v for k, v in record.items() if k != 'time'} for record in records]
+
+
+def run_backend(backend, pages, repeat, results):
+    """Runs in a fresh process so peak RSS belongs to this backend alone"""
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            parse_listings(html, 'make', 'make-model', backend)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    output = [comparable(parse_listings(html, 'make', 'make-model', backend)) for html in pages]
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({
+        'backend': backend,
+        'pages': len(pages) * repeat,
+        'seconds': round(elapsed, 3),
+        'pages_per_second': round(len(pages) * repeat / elapsed, 1) if elapsed else None,
+        'cards': sum(len(records) for records in output),
+        'peak_rss_growth_mb': round((rss_after - rss_before) / 1024, 1),  # ru_maxrss is KiB on Linux
+        'python_peak_mb': round(python_peak / 1e6, 1),
+        'output': output,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark listing parser backends")
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'),
+                        help="Directory of saved results pages (*.html)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, '*.html')))
+    if not paths:
+        print(f"No .html fixtures found in {args.fixtures}")
+        return
+    pages = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            pages.append(f.read())
+
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for backend in available_backends():
+        results = context.Queue()
+        process = context.Process(target=run_backend, args=(backend, pages, args.repeat, results))
+        process.start()
+        reports.append(results.get())
+        process.join()
+
+    # bs4 is the reference implementation
+    reference = next(r['output'] for r in reports if r['backend'] == 'bs4')
+    for report in reports:
+        output = report.pop('output')
+        report['mismatched_pages'] = sum(a != b for a, b in zip(output, reference))
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    print(f"{len(pages)} pages x {args.repeat} repeats")
+    for r in reports:
+        print(f"  {r['backend']:<10} {r['pages_per_second']:>8} pages/s  "
+              f"rss +{r['peak_rss_growth_mb']} MB  python peak {r['python_peak_mb']} MB  "
+              f"{r['cards']} cards  {r['mismatched_pages']} mismatched pages")
+
+
+if __name__ == "__main__":
+    main()
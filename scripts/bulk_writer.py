@@ -0,0 +1,218 @@
+# bulk_writer.py
+#
+# Single writer thread for scraped listings. Scrape workers hand it
+# ready-made rows through a queue; it upserts them in large transactions,
+# either as multi-row INSERT ... VALUES statements or by streaming a temp
+# file through LOAD DATA LOCAL INFILE into a staging table.
+
+import os
+import queue
+import tempfile
+import time
+from threading import Lock, Thread
+
+import data_version
+
+METHODS = ('values', 'load_data')
+
+_STOP = object()
+
+
+def _tsv_field(value):
+    """Format one value for LOAD DATA's default tab-separated format"""
+    if value is None or (isinstance(value, float) and value != value):
+        return "\\N"
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class BulkWriter:
+    """Upserts queued rows from a single thread, committing every commit_rows rows"""
+
+    def __init__(self, pool, columns, table_name='Cars', key_columns=('link',), keep_columns=(),
+                 method='values', chunk_rows=1000, commit_rows=20000, flush_interval=2.0, queue_size=64):
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+        self.pool = pool
+        self.columns = list(columns)
+        self.table_name = table_name
+        self.method = method
+        self.chunk_rows = chunk_rows
+        self.commit_rows = commit_rows
+        self.flush_interval = flush_interval
+
+        self.cols_str = ",".join(f"`{col}`" for col in self.columns)
+        # Columns left alone when a row already exists
+        skip = set(key_columns) | set(keep_columns)
+        self.updates = ",".join(
+            f"{table_name}.`{col}` = VALUES(`{col}`)" for col in self.columns if col not in skip
+        )
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = Thread(target=self._run, name="bulk-writer", daemon=True)
+
+        self.stats_lock = Lock()
+        self.rows = 0
+        self.transactions = 0
+        self.statements = 0
+        self.failed_rows = 0
+        self.callback_errors = 0
+        self.write_seconds = 0.0
+        self.started = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self.thread.start()
+        return self
+
+    def submit(self, rows, on_written=None):
+        """Queue rows for writing; on_written() runs once they are committed (never if the write fails)"""
+        if rows:
+            self._put((rows, on_written))
+        elif on_written is not None:
+            on_written()
+
+    def close(self):
+        """Flush everything still queued and stop the writer thread"""
+        if self.thread.is_alive():
+            try:
+                self._put(_STOP)
+            except RuntimeError:
+                pass
+            self.thread.join()
+
+    def _put(self, item):
+        # Block while the queue is full, but never on a writer thread that has died
+        while True:
+            if not self.thread.is_alive():
+                raise RuntimeError("Bulk writer thread is not running")
+            try:
+                self.queue.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self):
+        pending = []
+        callbacks = []
+        pending_since = None
+        stopping = False
+        while not stopping:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                rows, on_written = item
+                if not pending:
+                    pending_since = time.monotonic()
+                pending.extend(rows)
+                if on_written is not None:
+                    callbacks.append(on_written)
+
+            # Commit when the batch is large enough, has waited flush_interval, or we stop
+            if pending and (len(pending) >= self.commit_rows or stopping or item is None
+                            or time.monotonic() - pending_since >= self.flush_interval):
+                self._flush(pending, callbacks)
+                pending = []
+                callbacks = []
+
+    def _flush(self, rows, callbacks):
+        start = time.perf_counter()
+        try:
+            with self.pool.connection() as conn, conn.cursor() as cursor:
+                try:
+                    if self.method == 'load_data':
+                        statements = self._load_data(cursor, rows)
+                    else:
+                        statements = self._insert_values(cursor, rows)
+                    # Invalidates the API's cached counts in the same transaction
+                    data_version.bump(cursor, self.table_name)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            print(f"Bulk write of {len(rows)} rows failed: {e}")
+            with self.stats_lock:
+                self.failed_rows += len(rows)
+            return
+
+        elapsed = time.perf_counter() - start
+        with self.stats_lock:
+            self.rows += len(rows)
+            self.transactions += 1
+            self.statements += statements
+            self.write_seconds += elapsed
+        print(f"Upserted {len(rows)} rows into {self.table_name} in {elapsed:.2f}s")
+
+        for on_written in callbacks:
+            # A failing callback (e.g. checkpoint I/O) must not kill the writer thread
+            try:
+                on_written()
+            except Exception as e:
+                print(f"Bulk write callback failed: {e}")
+                with self.stats_lock:
+                    self.callback_errors += 1
+
+    def _insert_values(self, cursor, rows):
+        row_placeholder = "(" + ",".join(["%s"] * len(self.columns)) + ")"
+        statements = 0
+        for i in range(0, len(rows), self.chunk_rows):
+            chunk = rows[i:i + self.chunk_rows]
+            values = ",".join([row_placeholder] * len(chunk))
+            params = [value for row in chunk for value in row]
+            cursor.execute(
+                f"INSERT INTO {self.table_name} ({self.cols_str}) VALUES {values} "
+                f"ON DUPLICATE KEY UPDATE {self.updates}",
+                params
+            )
+            statements += 1
+        return statements
+
+    def _load_data(self, cursor, rows):
+        # Same column types as the target, but no keys so the load is a plain append.
+        # CREATE/DROP TEMPORARY don't commit, so this all stays one transaction.
+        stage = f"{self.table_name}_stage"
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {stage}")
+        cursor.execute(f"CREATE TEMPORARY TABLE {stage} SELECT {self.cols_str} FROM {self.table_name} LIMIT 0")
+
+        fd, path = tempfile.mkstemp(prefix="bulk_", suffix=".tsv")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+                for row in rows:
+                    f.write("\t".join(_tsv_field(value) for value in row))
+                    f.write("\n")
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {stage} CHARACTER SET utf8mb4 ({self.cols_str})",
+                (path,)
+            )
+        finally:
+            os.remove(path)
+
+        cursor.execute(
+            f"INSERT INTO {self.table_name} ({self.cols_str}) SELECT {self.cols_str} FROM {stage} "
+            f"ON DUPLICATE KEY UPDATE {self.updates}"
+        )
+        cursor.execute(f"DROP TEMPORARY TABLE {stage}")
+        return 1
+
+    def stats(self):
+        with self.stats_lock:
+            elapsed = time.monotonic() - self.started if self.started else 0.0
+            return {
+                "method": self.method,
+                "rows": self.rows,
+                "transactions": self.transactions,
+                "statements": self.statements,
+                "failed_rows": self.failed_rows,
+                "callback_errors": self.callback_errors,
+                "queued": self.queue.qsize(),
+                "write_seconds": round(self.write_seconds, 2),
+                # Throughput of the writes themselves and over the whole run
+                "rows_per_second": round(self.rows / self.write_seconds, 1) if self.write_seconds else 0.0,
+                "run_rows_per_second": round(self.rows / elapsed, 1) if elapsed else 0.0,
+            }
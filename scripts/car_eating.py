@@ -1,201 +1,361 @@
 import requests
-from bs4 import BeautifulSoup
 import pandas as pd
-import time
 import os
-import re
 import json
-import random
-from urllib.robotparser import RobotFileParser
+import hashlib
+import argparse
 from fake_useragent import UserAgent
-import pymysql
 from math import ceil
 from threading import Lock, Event, Thread
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+from functools import partial
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / "car_score_api"))
 from env.config import config
+from db_pool import create_pool
+import data_version
+from fetcher import Fetcher
+from listing_parser import parse_listings, parse_int
+from checkpoint import Checkpoint
+from bulk_writer import BulkWriter
+from pipeline import Pipeline, Stage
+import columnar_sink
 
 # Configure settings
 MAX_PAGES = 200  # Limit pages to scrape (was 5)
-DELAY = 3  # Seconds between requests 
 BASE_URL = "https://www.cars.com"
 
 NUM_WORKERS = 15
 CSV_LOCK = Lock()
 
+SCRAPER_CONFIG = config.get('scraper', {})
+
+# Politeness budget shared by all workers (the old per-thread sleeps came to about 4/s)
+REQUESTS_PER_SECOND = SCRAPER_CONFIG.get('requests_per_second', 4.0)
+MAX_RETRIES = SCRAPER_CONFIG.get('max_retries', 3)
+
+# HTML parser: 'auto' uses selectolax or lxml when installed, else BeautifulSoup
+PARSER_BACKEND = SCRAPER_CONFIG.get('parser', 'auto')
+
+# Optional directory to save fetched result pages to (fixtures for benchmark_parser.py)
+SAVE_HTML_DIR = SCRAPER_CONFIG.get('save_html_dir')
+
+# Listing output: 'parquet' or 'arrow' files per make and run, 'csv' for the old
+# cars_data.csv; 'auto' uses parquet when pyarrow is installed
+OUTPUT_FORMAT = SCRAPER_CONFIG.get('output', 'auto')
+if OUTPUT_FORMAT == 'auto':
+    OUTPUT_FORMAT = 'parquet' if columnar_sink.pa is not None else 'csv'
+OUTPUT_DIR = SCRAPER_CONFIG.get('output_dir') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'listings')
+
+# Incremental runs upsert by link and sweep listings not seen for STALE_DAYS
+STALE_DAYS = SCRAPER_CONFIG.get('stale_days', 7)
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scrape_checkpoint.json')
+
+# Listing fields that decide whether a listing changed and needs re-scoring
+FINGERPRINT_FIELDS = ['title', 'condition', 'year', 'price', 'monthly_payment', 'mileage', 'dealer', 'region']
+
+# Scoring: 'http' posts batches to the API, 'inprocess' loads CarScorePredictor here
+SCORING = SCRAPER_CONFIG.get('scoring', 'http')
+SCORING_NER_MODE = SCRAPER_CONFIG.get('ner_mode', 'ner')
+SCORE_BATCH_SIZE = 256
+
+# Pipeline stages: fetch waits on the network, parse and score use the CPU
+FETCH_WORKERS = SCRAPER_CONFIG.get('fetch_workers', NUM_WORKERS)
+PARSE_WORKERS = SCRAPER_CONFIG.get('parse_workers', 2)
+SCORE_WORKERS = SCRAPER_CONFIG.get('score_workers', 1)
+SCORE_BATCH_PAGES = SCRAPER_CONFIG.get('score_batch_pages', 16)  # pages scored together, ~20 listings each
+QUEUE_SIZE = SCRAPER_CONFIG.get('queue_size', 32)  # bound on every stage's input queue
+
+# Bulk writes: 'values' (multi-row INSERTs) or 'load_data' (LOAD DATA LOCAL INFILE)
+BULK_METHOD = SCRAPER_CONFIG.get('bulk_method', 'values')
+BULK_CHUNK_ROWS = SCRAPER_CONFIG.get('bulk_chunk_rows', 1000)
+BULK_COMMIT_ROWS = SCRAPER_CONFIG.get('bulk_commit_rows', 20000)
+
+# Cars columns written by the scraper, in row order
+LISTING_COLUMNS = [
+    "title", "make", "model", "modelTitle", "condition", "year", "mileage",
+    "price", "monthlyPayment", "dealer", "value", "region", "state", "link", "time",
+    "price_num", "mileage_num", "year_num", "fingerprint", "first_seen", "last_seen"
+]
+
+_scorer = None
+_scorer_lock = Lock()
+
 shutdown_event = Event()
 
-def db_connection():
-    db_config = config['db_config']
+# ColumnarSink for this run, unless writing CSV
+listing_sink = None
 
-    return pymysql.connect(
-        host=db_config['host'],
-        user=db_config['user'],
-        password=db_config['password'],
-        database=db_config['database'],
-    )
+# Score workers look up known listings; +1 for the writer and +1 for the main thread
+db_pool = create_pool(config, local_infile=BULK_METHOD == 'load_data', max_size=SCORE_WORKERS + 2)
 
-def check_robots_permission():
-    """Check if scraping is allowed by robots.txt"""
-    rp = RobotFileParser()
-    headers = get_random_headers()
-    try:
-        response = requests.get(f"{BASE_URL}/robots.txt", headers=headers, timeout=10)
-        response.raise_for_status()
-        rp.parse(response.text.splitlines())
-        return rp.can_fetch(headers['User-Agent'], BASE_URL + "/shopping/results/")
-    except Exception as e:
-        print(f"Failed to fetch or parse robots.txt: {e}")
-        return False
+# Loading the user agent data is slow, so do it once
+user_agents = UserAgent()
 
 def get_random_headers():
     """Generate random headers for each request"""
-    ua = UserAgent()
     return {
-        'User-Agent': ua.random,
+        'User-Agent': user_agents.random,
         'Accept-Language': 'en-US,en;q=0.9',
         'Referer': BASE_URL
     }
 
-def scrape_car_listings(search_url, make, model):
-    """Scrape car listings from search results"""
-    cars_data = []
-    seen_links = set()
-    
-    if not check_robots_permission():
-        print("Scraping not allowed by robots.txt")
-        return pd.DataFrame()
-    
-    for page in range(1, MAX_PAGES + 1):
-        try:
+# Keep-alive session, cached robots.txt and the global rate budget
+fetcher = Fetcher(
+    get_random_headers,
+    requests_per_second=REQUESTS_PER_SECOND,
+    pool_size=FETCH_WORKERS,
+    max_retries=MAX_RETRIES,
+    stop_event=shutdown_event,
+)
+
+# Single writer thread that owns all Cars inserts
+writer = BulkWriter(
+    db_pool,
+    LISTING_COLUMNS,
+    keep_columns=('first_seen',),  # first_seen keeps the original insert time
+    method=BULK_METHOD,
+    chunk_rows=BULK_CHUNK_ROWS,
+    commit_rows=BULK_COMMIT_ROWS,
+)
+
+class ModelCrawl:
+    """One model's crawl state, shared by the pipeline stages"""
+
+    def __init__(self, model, checkpoint=None):
+        self.model = model
+        self.make = model.split("-", 1)[0]
+        # Added no accidents, one owner, personal use, between 2k and 100k (my essentials and defaults for the neural net)
+        self.search_url = f"{BASE_URL}/shopping/results/?clean_title=true&include_shippable=true&list_price_max=100000&list_price_min=2000&makes[]={self.make}&models[]={model}&no_accidents=true&one_owner=true&personal_use=true&stock_type=used&sort=best_match_desc"
+        self.checkpoint = checkpoint
+        self.seen_links = set()
+        # The parse stage answers each fetched page: True if it had new listings,
+        # False if the model is exhausted, None if the page could not be parsed
+        self.verdicts = queue.Queue()
+
+        self.lock = Lock()
+        self.fetching = True
+        self.complete = False
+        self.pending_pages = 0
+        self.listings = 0
+
+    def page_queued(self, count):
+        with self.lock:
+            self.pending_pages += 1
+            self.listings += count
+
+    def page_written(self):
+        with self.lock:
+            self.pending_pages -= 1
+            self._check_done()
+
+    def fetch_finished(self, complete):
+        with self.lock:
+            self.fetching = False
+            self.complete = complete
+            self._check_done()
+
+    def _check_done(self):
+        # The model only counts as done once the writer has committed all its pages;
+        # a page loop cut short by shutdown must be redone on resume
+        if self.fetching or self.pending_pages:
+            return
+        print(f"Scraped {self.listings} listings for {self.model}")
+        if self.complete and self.checkpoint is not None:
+            self.checkpoint.mark_done(self.model)
+
+
+def fetch_pages(crawl, emit):
+    """Fetch stage: walk a model's result pages until one has nothing new"""
+    complete = False
+    # A page that failed to fetch or parse leaves the model incomplete, to be redone on resume
+    failed_pages = 0
+    try:
+        if shutdown_event.is_set():
+            return
+        if not fetcher.allowed(BASE_URL + "/shopping/results/"):
+            print("Scraping not allowed by robots.txt")
+            return
+
+        for page in range(1, MAX_PAGES + 1):
+            if shutdown_event.is_set():
+                return
             # Add pagination
-            url = f"{search_url}&page={page}" if "?" in search_url else f"{search_url}?page={page}"  
-            print(f"Scraping page {page}...")
-            response = requests.get(url, headers=get_random_headers(), timeout=5) #(was 15)
-            response.raise_for_status()
-
-            print(f"Requesting: {url}")
-            print(f"Status Code: {response.status_code}")
-      
+            url = f"{crawl.search_url}&page={page}"
+            try:
+                response = fetcher.get(url)
+            except Exception as e:
+                print(f"Error scraping {crawl.model} page {page}: {str(e)}")
+                failed_pages += 1
+                continue
+
             if "captcha" in response.text.lower():
                 print("Blocked by CAPTCHA or bot protection.")
-                break
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            listings = soup.find_all('div', class_='vehicle-card')
-            
-            if not listings:
-                print("No more listings found")
+                return
+
+            if SAVE_HTML_DIR:
+                os.makedirs(SAVE_HTML_DIR, exist_ok=True)
+                with open(os.path.join(SAVE_HTML_DIR, f"{crawl.model}-{page}.html"), 'w', encoding='utf-8') as f:
+                    f.write(response.text)
+
+            emit((crawl, page, response.text))
+            # Wait for the parser's verdict before asking for the next page
+            more = crawl.verdicts.get()
+            if more is None:
+                failed_pages += 1
+                continue
+            if not more:
                 break
 
-            new_cars_this_page = 0
-                
-            for car in listings:
-
-                # Ensure it is a new listing
-                link = BASE_URL + car.find('a', href=True)['href'] if car.find('a', href=True) else None
-                if link in seen_links:
-                    continue
-                
-                seen_links.add(link)
-                new_cars_this_page += 1
-
-                title = get_text(car, 'h2.title')
-                year_match = re.search(r'\b(\d{4})\b', title) if title else None
-                year = year_match.group(1) if year_match else None 
-
-                condition = None
-                modelTitle = None
-
-                if title and year:
-                    parts = re.split(r'\b' + year + r'\b', title, maxsplit=1)
-                    condition = parts[0].strip() if parts[0].strip() else None
-                    modelTitle = parts[1].strip() if len(parts) > 1 else None
-
-                car_info = {
-                    'time': pd.Timestamp.now(),
-                    'title': title,
-                    'make': make.capitalize(),
-                    'model': model,
-                    'modelTitle': modelTitle, 
-                    'condition': condition,
-                    'year': year,
-                    'price': get_text(car, 'span.primary-price'),
-                    'monthly_payment': f"${get_attribute(car, 'spark-button', 'monthly-payment-est-link', 'phx-value-monthly-payment')}/mo" if get_attribute(car, 'spark-button', 'monthly-payment-est-link', 'phx-value-monthly-payment') else None,
-                    'mileage': get_text(car, 'div.mileage'),
-                    'dealer': get_text(car, 'div.dealer-name'),
-                    'region': get_region(car),
-                    'state': extract_state(get_region(car)),
-                    'link': BASE_URL + car.find('a', href=True)['href'] if car.find('a', href=True) else None,
-                }
-                cars_data.append(car_info)
-
-            if new_cars_this_page == 0:
-                print("No new listings on the page. Stop scrapping it.")
-                break
-            
-            time.sleep(DELAY + random.uniform(0, 1))  # Random delay
-            
-        except Exception as e:
-            print(f"Error scraping page {page}: {str(e)}")
-            continue
-    
-    return pd.DataFrame(cars_data)
-
-def get_text(soup, selector):
-    """Helper to safely extract text"""
-    element = soup.select_one(selector)
-    return element.get_text(strip=True) if element else None
+        complete = failed_pages == 0
+        if failed_pages:
+            print(f"{failed_pages} pages of {crawl.model} failed; it stays unfinished")
+    finally:
+        crawl.fetch_finished(complete)
 
-def get_attribute(soup, tag, class_name, attribute):
-    """Safely extract attribute value from a tag with a class"""
-    element = soup.find(tag, class_=class_name)
-    return element.get(attribute) if element and element.has_attr(attribute) else None
 
-def get_region(car_soup):
+def parse_page(item, emit):
+    """Parse stage: turn a page into new listings and tell the fetcher whether to go on"""
+    crawl, page, html = item
+    # Stays None if anything below raises, so the fetcher can tell a failure from the end
+    more = None
     try:
-        dealer_section = car_soup.find("div", class_="vehicle-dealer")
-        if dealer_section:
-            miles_div = dealer_section.find("div", {"data-qa": "miles-from-user"})
-            if miles_div:
-                text = miles_div.get_text(strip=True)
-                match = re.match(r"^(.*)\s+\(\d+\s*mi\.\)$", text)
-                if match:
-                    return match.group(1).strip()
-                else:
-                    return text.split("(")[0].strip()
-    except Exception as e:
-        print(f"[get_region] Error: {e}")
-    return None
+        # Single pass over the page into car_info dicts
+        listings = parse_listings(html, crawl.make, crawl.model, PARSER_BACKEND)
+        if not listings:
+            print(f"No more listings found for {crawl.model}")
+            more = False
+            return
+
+        new_listings = []
+        for car_info in listings:
+            # Ensure it is a new listing
+            link = car_info['link']
+            if link in crawl.seen_links:
+                continue
+            crawl.seen_links.add(link)
+            new_listings.append(car_info)
+
+        if not new_listings:
+            print(f"No new listings on page {page} of {crawl.model}. Stop scrapping it.")
+            more = False
+            return
+
+        crawl.page_queued(len(new_listings))
+        emit((crawl, new_listings))
+        more = True
+    finally:
+        crawl.verdicts.put(more)
+
+
+class InProcessScorer:
+    """Scores descriptions with a CarScorePredictor loaded in this process"""
+
+    def __init__(self):
+        from car_score_predictor import CarScorePredictor
+        self.predictor = CarScorePredictor(ner_mode=SCORING_NER_MODE)
+        self.lock = Lock()
+
+    def score(self, descriptions):
+        # One batch at a time keeps the transformer pipeline single-threaded
+        with self.lock:
+            return self.predictor.predict_batch(descriptions)
+
+
+class HttpScorer:
+    """Scores descriptions through /predict/batch over one keep-alive session"""
+
+    def __init__(self):
+        self.url = f"http://{config['ip']}:{config['port']}/predict/batch"
+        self.session = requests.Session()
+
+    def score(self, descriptions):
+        response = self.session.post(self.url, json={"descriptions": descriptions, "mode": SCORING_NER_MODE}, timeout=300)
+        response.raise_for_status()
+        return response.json()['results']
+
+
+def get_scorer():
+    """Shared scorer for all worker threads, created on first use"""
+    global _scorer
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                _scorer = HttpScorer() if SCORING == 'http' else InProcessScorer()
+    return _scorer
+
+
+def describe_listing(row):
+    return f"{row['condition']} {row['year']} {row['model']} with {row['mileage']} miles, priced at {row['price']} or {row['monthly_payment']} at {row['dealer']}"
 
-def extract_state(region):
-    if region and ',' in region:
-        return region.strip()[-2:]
-    return None
 
+def listing_fingerprint(row):
+    content = "\x1f".join("" if row.get(field) is None else str(row.get(field)) for field in FINGERPRINT_FIELDS)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def add_fingerprints(df):
+    df = df.copy()
+    df['fingerprint'] = [listing_fingerprint(row) for row in df.to_dict('records')]
+    return df
+
+
+def reuse_known_values(df, table_name='Cars'):
+    """Copy the stored value onto listings whose fingerprint is unchanged"""
+    links = [link for link in df['link'] if link]
+    known = {}
+    with db_pool.connection() as conn, conn.cursor() as cursor:
+        for i in range(0, len(links), 1000):
+            chunk = links[i:i + 1000]
+            placeholders = ",".join(["%s"] * len(chunk))
+            cursor.execute(f"SELECT link, fingerprint, value FROM {table_name} WHERE link IN ({placeholders})", chunk)
+            for link, fingerprint, value in cursor.fetchall():
+                known[link] = (fingerprint, value)
+
+    values = []
+    for link, fingerprint in zip(df['link'], df['fingerprint']):
+        stored = known.get(link)
+        values.append(stored[1] if stored and stored[0] == fingerprint and stored[1] is not None else None)
+
+    df = df.copy()
+    df['value'] = pd.Series(values, index=df.index, dtype=float)
+    reused = int(df['value'].notna().sum())
+    if reused:
+        print(f"Reusing {reused} unchanged scores")
+    return df
 
 
 def add_predicted_values(df):
+    """Score listings without a value, in batches, into the 'value' column"""
+    df = df.copy()
+    if 'value' not in df.columns:
+        df['value'] = float('nan')
+    missing = df.index[df['value'].isna()]
+    if len(missing) == 0:
+        return df
+
+    descriptions = [describe_listing(row) for row in df.loc[missing].to_dict('records')]
+    scorer = get_scorer()
     values = []
 
-    for _, row in df.iterrows():
+    for i in range(0, len(descriptions), SCORE_BATCH_SIZE):
+        chunk = descriptions[i:i + SCORE_BATCH_SIZE]
         try:
-            description = f"{row['year']} {row['modelTitle']} {row['condition']}, {row['mileage']} miles, {row['price']}"
-            response = requests.post(f"http://{config['ip']}:{config['port']}/predict", json={"description": description})
-            result = response.json()
-            score = float(result.get('score', 0.0))
+            results = scorer.score(chunk)
         except Exception as e:
-            print(f"Prediction failed for row: {row.to_dict()}, error: {e}")
-            score = 0.0  # fallback score
+            print(f"Prediction failed for {len(chunk)} rows, error: {e}")
+            results = [{'error': str(e)}] * len(chunk)
 
-        values.append(score)
+        for description, result in zip(chunk, results):
+            if 'score' not in result:
+                print(f"Prediction failed for row: {description}, error: {result.get('error')}")
+            values.append(float(result.get('score', 0.0)))  # fallback score
 
-    df = df.copy()
-    df['value'] = values
+    df.loc[missing, 'value'] = values
     return df
 
 
@@ -211,48 +371,43 @@ def save_to_csv(df, filename='cars_data.csv'):
 
 
 
-def save_to_mysql(df, cursor, conn, table_name='Cars'):
-
+def listing_rows(df):
+    """Turn scored listings into Cars rows (tuples in LISTING_COLUMNS order)"""
     if df.empty:
-        print("No data to insert")
-        return
-    
-    df['time'] = df['time'].astype(str)
-    df = df.rename(columns={"monthly_payment": "monthlyPayment"})
+        return []
 
-    # Predict value for each row
-    values = []
-    for _, row in df.iterrows():
-        try:
-            description = f"{row['condition']} {row['year']} {row['model']} with {row['mileage']} miles, priced at {row['price']} or {row['monthlyPayment']} at {row['dealer']}"
-            response = requests.post(f"http://{config['ip']}:{config['port']}/predict", json={"description": description})
-            result = response.json()
-            score = float(result.get('score', 0.0))
-        except Exception as e:
-            print(f"Prediction failed for row: {row.to_dict()}, error: {e}")
-            score = 0.0  # fallback value if prediction fails
+    # Rows are normally scored already by add_predicted_values
+    if 'fingerprint' not in df.columns:
+        df = add_fingerprints(df)
+    if 'value' not in df.columns or df['value'].isna().any():
+        df = add_predicted_values(df)
 
-        values.append(score)
+    df = df.rename(columns={"monthly_payment": "monthlyPayment"})
+    df['time'] = df['time'].astype(str)
 
-    df['value'] = values
+    # Typed copies for the indexed /cars filters (no digits -> 0, like the old CAST)
+    df['price_num'] = pd.Series([parse_int(v, 0) for v in df['price']], index=df.index, dtype=object)
+    df['mileage_num'] = pd.Series([parse_int(v, 0) for v in df['mileage']], index=df.index, dtype=object)
+    df['year_num'] = pd.Series([parse_int(v) for v in df['year']], index=df.index, dtype=object)
 
-    columns = [
-        "title", "make", "model", "modelTitle", "`condition`", "year", "mileage", 
-        "price", "monthlyPayment", "dealer", "value", "region", "state", "link", "time"
-    ]
-    cols_str = ",".join(columns)
+    # Seen-at timestamps drive the stale listing sweep (naive UTC in the DATETIME columns)
+    seen_at = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    df['first_seen'] = pd.Series([seen_at] * len(df), index=df.index, dtype=object)
+    df['last_seen'] = df['first_seen']
 
-    placeholders = ",".join(["%s"] * len(columns))
-    insert_stmt = f"INSERT INTO {table_name} ({cols_str}) VALUES ({placeholders})"
+    return list(df[LISTING_COLUMNS].astype(object).itertuples(index=False, name=None))
 
-    data = [tuple(row) for row in df[
-        ["title", "make", "model", "modelTitle", "condition", "year", "mileage", 
-         "price", "monthlyPayment", "dealer", "value", "region", "state", "link", "time"]
-    ].itertuples(index=False, name=None)]
 
-    cursor.executemany(insert_stmt, data)
-    conn.commit()
-    print(f"Inserted {len(df)} rows into {table_name}")
+def sweep_stale_listings(days, table_name='Cars'):
+    """Delete listings that no run has seen within the last `days` days"""
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    with db_pool.connection() as conn, conn.cursor() as cursor:
+        deleted = cursor.execute(f"DELETE FROM {table_name} WHERE last_seen < %s", (cutoff,))
+        if deleted:
+            data_version.bump(cursor, table_name)
+        conn.commit()
+    print(f"Swept {deleted} listings not seen in {days} days")
+    return deleted
 
 
 def load_make_model_slugs(json_file_path):
@@ -279,6 +434,13 @@ def save_to_csv_threadsafe(df, filename):
     with CSV_LOCK:
         save_to_csv(df, filename)
 
+def save_listings(df):
+    """Columnar sink when configured (no shared lock), else the CSV append"""
+    if listing_sink is not None:
+        listing_sink.write(df)
+    else:
+        save_to_csv_threadsafe(df, 'cars_data.csv')
+
 def listen_for_shutdown_key():
     print("[Press 'o' then Enter to stop scraping gracefully]")
     for line in sys.stdin:
@@ -288,82 +450,126 @@ def listen_for_shutdown_key():
             break
 
 
-def scrape_model(model):
+def score_pages(batch, emit, incremental=True):
+    """Score stage: score a batch of pages together and queue their rows for the writer"""
+    cars_df = pd.concat([pd.DataFrame(listings) for _, listings in batch], ignore_index=True)
 
-    if shutdown_event.is_set():
-        return
-
-    MODEL = model
-    MAKE = model.split("-", 1)[0]
-
-    # Added no accidents, one owner, personal use, between 2k and 100k (my essentials and defaults for the neural net)
+    # Only new or changed listings go through the model
+    cars_df = add_fingerprints(cars_df)
+    if incremental:
+        cars_df = reuse_known_values(cars_df)
+    cars_df = add_predicted_values(cars_df)
+    save_listings(cars_df)
 
-    SEARCH_URL = f"{BASE_URL}/shopping/results/?clean_title=true&include_shippable=true&list_price_max=100000&list_price_min=2000&makes[]={MAKE}&models[]={MODEL}&no_accidents=true&one_owner=true&personal_use=true&stock_type=used&sort=best_match_desc"
-            
-    try: 
+    offset = 0
+    for crawl, listings in batch:
+        page_df = cars_df.iloc[offset:offset + len(listings)]
+        offset += len(listings)
+        writer.submit(listing_rows(page_df), crawl.page_written)
+        emit(len(page_df))
 
-        # Make per-thread MySQL connection
-        thread_conn = db_connection()
-        thread_cursor = thread_conn.cursor()
 
-        time.sleep(random.uniform(2, 4))
+def build_pipeline(incremental=True):
+    """fetch -> parse -> score, each with its own workers; the BulkWriter persists"""
+    return Pipeline([
+        Stage("fetch", fetch_pages, workers=FETCH_WORKERS, queue_size=QUEUE_SIZE),
+        Stage("parse", parse_page, workers=PARSE_WORKERS, queue_size=QUEUE_SIZE),
+        Stage("score", partial(score_pages, incremental=incremental), workers=SCORE_WORKERS,
+              queue_size=QUEUE_SIZE, batch_size=SCORE_BATCH_PAGES),
+    ])
 
-        cars_df = scrape_car_listings(SEARCH_URL, MAKE, MODEL)
-
-        if not cars_df.empty:
-            cars_df = add_predicted_values(cars_df)
-            save_to_csv_threadsafe(cars_df, 'cars_data.csv')
-            save_to_mysql(cars_df, thread_cursor, thread_conn)
-            print(f"Scraped {len(cars_df)} listings for {MODEL}")
-        else:
-            print(f"No data for {MODEL}")
 
-    except Exception as e:
+def report_progress(pipeline, stop_event, interval=30):
+    while not stop_event.wait(interval):
+        print(f"[pipeline] {pipeline.summary()}  write: {writer.stats()['queued']} queued")
 
-        print(f"Error scraping model {MODEL}: {e}")
-    
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Scrape cars.com listings into the Cars table")
+    parser.add_argument("--full", action="store_true",
+                        help="TRUNCATE Cars and re-score every listing (with --resume: keep the rows already written)")
+    parser.add_argument("--resume", action="store_true", help="Skip models finished by an interrupted run")
+    args = parser.parse_args()
+    incremental = not args.full
+
     start = datetime.now()
 
-    models = load_make_model_slugs("all_make_model_keys.json")
+    all_models = load_make_model_slugs("all_make_model_keys.json")
+    models = all_models
 
-    conn = db_connection()
-    cursor = conn.cursor()
+    checkpoint = Checkpoint(CHECKPOINT_PATH)
+    interrupted = False
+    pipeline = None
+    stop_reporting = Event()
 
     try:
 
-        cursor.execute("TRUNCATE TABLE Cars")
-        conn.commit()
-        print("Cleared existing rows from Cars table.")
-
-        if os.path.exists('cars_data.csv'):
-            os.remove('cars_data.csv')
-            print("Reset the existing cars.csv")
+        # A resumed full run keeps what it already wrote: the checkpoint skips those models
+        truncate = not incremental and not args.resume
+        with db_pool.connection() as conn, conn.cursor() as cursor:
+            data_version.ensure_table(cursor)
+            if truncate:
+                cursor.execute("TRUNCATE TABLE Cars")
+                data_version.bump(cursor)
+            conn.commit()
+        if truncate:
+            print("Cleared existing rows from Cars table.")
+
+        if args.resume:
+            checkpoint.load()
+            models = [model for model in models if not checkpoint.is_done(model)]
+            print(f"Resuming: {len(checkpoint.completed)} models already done, {len(models)} left")
+        else:
+            checkpoint.start()
+            if OUTPUT_FORMAT == 'csv' and os.path.exists('cars_data.csv'):
+                os.remove('cars_data.csv')
+                print("Reset the existing cars.csv")
 
         listener_thread = Thread(target=listen_for_shutdown_key, daemon=True)
         listener_thread.start()
 
-        with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-            futures = [executor.submit(scrape_model, model) for model in models]
-        
+        if OUTPUT_FORMAT != 'csv':
+            # Every run gets its own directory, so nothing to reset
+            listing_sink = columnar_sink.ColumnarSink(OUTPUT_DIR, fmt=OUTPUT_FORMAT)
+            print(f"Writing listings to {listing_sink.run_dir}")
+
+        writer.start()
+        pipeline = build_pipeline(incremental).start()
+        Thread(target=report_progress, args=(pipeline, stop_reporting), daemon=True).start()
+
         try:
+            # Blocks while the fetch queue is full, so models are fed as workers free up
+            for model in models:
+                if shutdown_event.is_set():
+                    break
+                pipeline.put(ModelCrawl(model, checkpoint))
+            pipeline.close()
 
-                for future in as_completed(futures):
-                    try:
-                        future.result()
-                    except Exception as e:
-                        print(f"Thread failed: {e}")
-        
         except KeyboardInterrupt:
             print("Interrupted by user. Shutting down...")
+            interrupted = True
             shutdown_event.set()
-            executor.shutdown(wait=False, cancel_futures=True)
+            pipeline.close()
+
+        # Commit whatever the workers queued before sweeping
+        writer.close()
+
+        # Only a complete crawl may retire listings and clear the checkpoint: every
+        # model checkpointed, none cut short by robots.txt, a CAPTCHA or a failed write
+        unfinished = [model for model in all_models if not checkpoint.is_done(model)]
+        if not interrupted and not shutdown_event.is_set() and not unfinished and not writer.failed_rows:
+            if incremental:
+                sweep_stale_listings(STALE_DAYS)
+            checkpoint.finish()
+        else:
+            if writer.failed_rows:
+                print(f"{writer.failed_rows} rows failed to write; their models stay unfinished")
+            print(f"{len(unfinished)} models unfinished, skipping the stale listing sweep; "
+                  f"rerun with --resume to continue ({CHECKPOINT_PATH})")
     
     except Exception as e:
         print(f"Fatal Error: {e}")
-        conn.rollback()
 
     finally:
         now = datetime.now()
@@ -374,6 +580,15 @@ if __name__ == "__main__":
         minutes = remaining_seconds // 60
         seconds = remaining_seconds % 60
         print(f"Elapsed: {hours}h, {minutes}m, {seconds}s")
-
-        cursor.close()
-        conn.close()
+        print(f"Fetcher: {fetcher.stats()}")
+        stop_reporting.set()
+        writer.close()
+        if pipeline is not None:
+            print(f"Pipeline: {pipeline.stats()}")
+        if listing_sink is not None:
+            listing_sink.close()
+            print(f"Listings: {listing_sink.stats()}")
+        print(f"Writer: {writer.stats()}")
+        print(f"DB pool: {db_pool.stats()}")
+
+        db_pool.close()
@@ -0,0 +1,57 @@
+# checkpoint.py
+#
+# Persists which models a crawl has finished so an interrupted run can
+# resume where it stopped instead of starting over.
+
+import json
+import os
+from datetime import datetime, timezone
+from threading import Lock
+
+
+class Checkpoint:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.state = {"started": None, "completed": []}
+        self.completed = set()
+
+    def load(self):
+        """Load the previous run's progress, if any"""
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self.state = json.load(f)
+        self.completed = set(self.state.get("completed", []))
+        return self
+
+    def start(self):
+        """Begin a fresh run, forgetting earlier progress"""
+        with self.lock:
+            self.state = {"started": datetime.now(timezone.utc).isoformat(), "completed": []}
+            self.completed = set()
+            self._write()
+
+    def is_done(self, model):
+        return model in self.completed
+
+    def mark_done(self, model):
+        with self.lock:
+            if model in self.completed:
+                return
+            self.completed.add(model)
+            self.state["completed"].append(model)
+            self._write()
+
+    def finish(self):
+        """The run completed; nothing left to resume"""
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _write(self):
+        # Write then rename so a crash never leaves a half-written file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
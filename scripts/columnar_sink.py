@@ -0,0 +1,203 @@
+# columnar_sink.py
+#
+# Typed, partitioned output for scraped listings. Each run writes one file
+# per make under <base_dir>/run=<run_id>/make=<make>/, as Parquet or Arrow
+# IPC. Files are written as *.tmp and renamed once their footer is written,
+# so a crashed run leaves no unreadable files behind for read_listings.
+# Display strings like "$14,995" and "98,302 mi." are parsed to ints once
+# here, so retraining and scoring backfills read typed columns
+# (memory-mapped) instead of reparsing a CSV.
+#
+# pyarrow is optional; car_eating.py falls back to cars_data.csv without it.
+
+import os
+import re
+from datetime import datetime
+from threading import Lock
+
+import pandas as pd
+
+from listing_parser import parse_int
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATS = ('parquet', 'arrow')
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+STRING_FIELDS = ['title', 'make', 'model', 'modelTitle', 'condition', 'dealer', 'region', 'state', 'link', 'fingerprint']
+
+
+def listing_schema():
+    return pa.schema([
+        ('time', pa.timestamp('us')),
+        ('title', pa.string()),
+        ('make', pa.string()),
+        ('model', pa.string()),
+        ('modelTitle', pa.string()),
+        ('condition', pa.string()),
+        ('year', pa.int16()),
+        ('price', pa.int32()),
+        ('monthly_payment', pa.int32()),
+        ('mileage', pa.int32()),
+        ('dealer', pa.string()),
+        ('region', pa.string()),
+        ('state', pa.string()),
+        ('link', pa.string()),
+        ('fingerprint', pa.string()),
+        ('value', pa.float32()),
+    ])
+
+
+def to_table(df):
+    """Scored listings DataFrame -> Arrow table in listing_schema()"""
+    schema = listing_schema()
+
+    def ints(column):
+        return [parse_int(v) for v in df[column]] if column in df.columns else [None] * len(df)
+
+    def strings(column):
+        if column not in df.columns:
+            return [None] * len(df)
+        return [None if v is None or v != v else str(v) for v in df[column]]
+
+    columns = {
+        'time': pd.to_datetime(df['time']),
+        'year': ints('year'),
+        'price': ints('price'),
+        'monthly_payment': ints('monthly_payment'),
+        'mileage': ints('mileage'),
+        'value': df['value'] if 'value' in df.columns else [None] * len(df),
+    }
+    for column in STRING_FIELDS:
+        columns[column] = strings(column)
+
+    return pa.table(
+        [pa.array(columns[field.name], type=field.type, from_pandas=True) for field in schema],
+        schema=schema,
+    )
+
+
+def _partition_name(value):
+    return re.sub(r'[^A-Za-z0-9_-]', '_', str(value)) or '_'
+
+
+class _Partition:
+
+    def __init__(self, writer, path, tmp_path):
+        self.lock = Lock()
+        self.writer = writer
+        self.path = path
+        self.tmp_path = tmp_path
+        self.buffered = []
+        self.buffered_rows = 0
+
+    def flush(self):
+        if self.buffered:
+            self.writer.write_table(pa.concat_tables(self.buffered))
+            self.buffered = []
+            self.buffered_rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+
+class ColumnarSink:
+    """Append listings to one open writer per make; each partition has its own lock"""
+
+    def __init__(self, base_dir, run_id=None, fmt='parquet', row_group_rows=10000):
+        if pa is None:
+            raise ImportError("pyarrow is not installed")
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {FORMATS}, got {fmt!r}")
+        self.fmt = fmt
+        # Pages arrive a few dozen rows at a time; buffer them into sensible row groups
+        self.row_group_rows = row_group_rows
+        self.run_id = run_id or datetime.now().strftime("%Y%m%dT%H%M%S")
+        self.run_dir = os.path.join(base_dir, f"run={self.run_id}")
+        self.schema = listing_schema()
+
+        # Guards only the partition dict; writes lock their own partition
+        self.partitions_lock = Lock()
+        self.partitions = {}
+
+        self.stats_lock = Lock()
+        self.rows = 0
+        self.files = 0
+
+    def _partition(self, make):
+        with self.partitions_lock:
+            if make not in self.partitions:
+                directory = os.path.join(self.run_dir, f"make={_partition_name(make)}")
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, "part-0" + EXTENSIONS[self.fmt])
+                tmp_path = path + ".tmp"
+                if self.fmt == 'parquet':
+                    writer = pq.ParquetWriter(tmp_path, self.schema, compression='zstd')
+                else:
+                    writer = pa.ipc.new_file(tmp_path, self.schema)
+                self.partitions[make] = _Partition(writer, path, tmp_path)
+                self.files += 1
+            return self.partitions[make]
+
+    def write(self, df):
+        if df.empty:
+            return
+        for make, part in df.groupby('make', sort=False):
+            table = to_table(part)
+            partition = self._partition(make)
+            with partition.lock:
+                partition.buffered.append(table)
+                partition.buffered_rows += table.num_rows
+                if partition.buffered_rows >= self.row_group_rows:
+                    partition.flush()
+        with self.stats_lock:
+            self.rows += len(df)
+
+    def close(self):
+        with self.partitions_lock:
+            for partition in self.partitions.values():
+                with partition.lock:
+                    partition.close()
+            self.partitions = {}
+
+    def stats(self):
+        with self.stats_lock:
+            return {"format": self.fmt, "run_dir": self.run_dir, "files": self.files, "rows": self.rows}
+
+
+def read_listings(path, columns=None):
+    """Read a run directory, a make partition or a single file, memory-mapped.
+
+    Unfinished *.tmp files (from a run that is still going or crashed) are skipped.
+    """
+    if pa is None:
+        raise ImportError("pyarrow is not installed")
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in names
+            if name.endswith(tuple(EXTENSIONS.values()))
+        )
+    else:
+        files = [path]
+
+    tables = []
+    for file in files:
+        if file.endswith('.arrow'):
+            # Zero-copy: record batches point into the mapped file
+            table = pa.ipc.open_file(pa.memory_map(file, 'r')).read_all()
+            tables.append(table.select(columns) if columns else table)
+        else:
+            tables.append(pq.read_table(file, columns=columns, memory_map=True))
+
+    if not tables:
+        empty = listing_schema().empty_table()
+        return empty.select(columns) if columns else empty
+    return pa.concat_tables(tables)
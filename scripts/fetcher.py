@@ -0,0 +1,163 @@
+# fetcher.py
+#
+# Shared HTTP fetch engine for the scrapers: one keep-alive session with a
+# connection pool, robots.txt parsed once per host, a global requests-per-
+# second budget and retries with exponential backoff. robots.txt goes
+# through the same budget and retries as every other request.
+
+import random
+import time
+from threading import Lock
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Statuses worth retrying; anything else fails straight away
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def acquire(self, stop_event=None):
+        """Block until a token is available; returns False if stop_event is set first"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class RobotsCache:
+    """robots.txt fetched and parsed once per host.
+
+    A failed fetch counts as disallowed, like before, but is only remembered
+    for retry_after seconds, so one transient error does not stop the run.
+    """
+
+    def __init__(self, fetch, user_agent, retry_after=60.0):
+        self.fetch = fetch
+        self.user_agent = user_agent
+        self.retry_after = retry_after
+        self.parsers = {}  # root -> (parser, or None after a failure; when to retry a failure)
+        self.lock = Lock()
+
+    def parser_for(self, url):
+        parts = urlsplit(url)
+        root = f"{parts.scheme}://{parts.netloc}"
+        with self.lock:
+            entry = self.parsers.get(root)
+            if entry is None or (entry[0] is None and time.monotonic() >= entry[1]):
+                rp = RobotFileParser()
+                try:
+                    response = self.fetch(f"{root}/robots.txt")
+                    rp.parse(response.text.splitlines())
+                    entry = (rp, None)
+                except Exception as e:
+                    print(f"Failed to fetch or parse robots.txt (retrying in {self.retry_after:.0f}s): {e}")
+                    entry = (None, time.monotonic() + self.retry_after)
+                self.parsers[root] = entry
+            return entry[0]
+
+    def can_fetch(self, url):
+        rp = self.parser_for(url)
+        return rp is not None and rp.can_fetch(self.user_agent, url)
+
+
+class Fetcher:
+    """Pooled, rate-limited GETs with retry and backoff"""
+
+    def __init__(self, headers_factory, requests_per_second=4.0, burst=1, pool_size=16,
+                 timeout=10, max_retries=3, backoff=1.0, stop_event=None):
+        self.headers_factory = headers_factory
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stop_event = stop_event
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.robots = RobotsCache(self.get, headers_factory()['User-Agent'])
+
+        self.stats_lock = Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+
+    def allowed(self, url):
+        return self.robots.can_fetch(url)
+
+    def get(self, url):
+        """GET a URL within the global rate budget, retrying transient failures"""
+        attempt = 0
+        while True:
+            if not self.bucket.acquire(self.stop_event):
+                raise RuntimeError("Fetcher stopped")
+
+            error = None
+            retry_after = None
+            try:
+                response = self.session.get(url, headers=self.headers_factory(), timeout=self.timeout)
+                with self.stats_lock:
+                    self.requests += 1
+                    self.bytes += len(response.content)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(f"{response.status_code} for {url}", response=response)
+                retry_after = response.headers.get('Retry-After')
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt >= self.max_retries:
+                with self.stats_lock:
+                    self.failures += 1
+                raise error
+
+            # Exponential backoff with jitter, or the server's Retry-After
+            delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            attempt += 1
+            with self.stats_lock:
+                self.retries += 1
+            if self.stop_event is not None and self.stop_event.wait(delay):
+                raise error
+            elif self.stop_event is None:
+                time.sleep(delay)
+
+    def stats(self):
+        with self.stats_lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "megabytes": round(self.bytes / 1e6, 2),
+                "requests_per_second": round(self.requests / elapsed, 2) if elapsed else 0.0,
+            }
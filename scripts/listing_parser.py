@@ -0,0 +1,206 @@
+# listing_parser.py
+#
+# Turns a cars.com search results page into car_info dicts. Each backend
+# walks the page once and reads every field of a vehicle card exactly once
+# into a RawCard; build_car_info then derives the final dict the same way
+# for all of them.
+#
+# Backends: 'selectolax' and 'lxml' are optional fast paths, 'bs4' is the
+# original BeautifulSoup html.parser path. 'auto' picks the fastest one
+# that is installed.
+
+import re
+from collections import namedtuple
+
+import pandas as pd
+
+BASE_URL = "https://www.cars.com"
+
+RawCard = namedtuple('RawCard', ['href', 'title', 'price', 'payment', 'mileage', 'dealer', 'region_text'])
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        # selectolax < 1.0 only ships the Modest backend
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+BACKENDS = ('auto', 'selectolax', 'lxml', 'bs4')
+
+
+def available_backends():
+    backends = []
+    if HTMLParser is not None:
+        backends.append('selectolax')
+    if lxml is not None:
+        backends.append('lxml')
+    backends.append('bs4')
+    return backends
+
+
+def region_from_text(text):
+    """'Chicago, IL (12 mi.)' -> 'Chicago, IL'"""
+    if text is None:
+        return None
+    match = re.match(r"^(.*)\s+\(\d+\s*mi\.\)$", text)
+    if match:
+        return match.group(1).strip()
+    return text.split("(")[0].strip()
+
+
+def parse_int(text, default=None):
+    """Digits of a display string like '$14,995' or '98,302 mi.' as an int"""
+    digits = re.sub(r'\D', '', str(text)) if text is not None else ''
+    return int(digits) if digits else default
+
+
+def extract_state(region):
+    if region and ',' in region:
+        return region.strip()[-2:]
+    return None
+
+
+def build_car_info(card, make, model, timestamp):
+    """Build the scraper's car_info dict from one RawCard"""
+    title = card.title
+    year_match = re.search(r'\b(\d{4})\b', title) if title else None
+    year = year_match.group(1) if year_match else None
+
+    condition = None
+    modelTitle = None
+
+    if title and year:
+        parts = re.split(r'\b' + year + r'\b', title, maxsplit=1)
+        condition = parts[0].strip() if parts[0].strip() else None
+        modelTitle = parts[1].strip() if len(parts) > 1 else None
+
+    region = region_from_text(card.region_text)
+
+    return {
+        'time': timestamp,
+        'title': title,
+        'make': make.capitalize(),
+        'model': model,
+        'modelTitle': modelTitle,
+        'condition': condition,
+        'year': year,
+        'price': card.price,
+        'monthly_payment': f"${card.payment}/mo" if card.payment else None,
+        'mileage': card.mileage,
+        'dealer': card.dealer,
+        'region': region,
+        'state': extract_state(region),
+        'link': BASE_URL + card.href if card.href is not None else None,
+    }
+
+
+# selectolax
+
+def _sx_text(node):
+    return node.text(deep=True, separator='', strip=True) if node is not None else None
+
+
+def _sx_cards(html):
+    tree = HTMLParser(html)
+    for car in tree.css('div.vehicle-card'):
+        link = car.css_first('a[href]')
+        button = car.css_first('spark-button.monthly-payment-est-link')
+        dealer_section = car.css_first('div.vehicle-dealer')
+        miles = dealer_section.css_first('div[data-qa="miles-from-user"]') if dealer_section is not None else None
+        yield RawCard(
+            href=link.attributes.get('href') if link is not None else None,
+            title=_sx_text(car.css_first('h2.title')),
+            price=_sx_text(car.css_first('span.primary-price')),
+            payment=button.attributes.get('phx-value-monthly-payment') if button is not None else None,
+            mileage=_sx_text(car.css_first('div.mileage')),
+            dealer=_sx_text(car.css_first('div.dealer-name')),
+            region_text=_sx_text(miles),
+        )
+
+
+# lxml
+
+def _has_class(tag, name):
+    return f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]"
+
+
+def _lx_first(node, xpath):
+    found = node.xpath(xpath)
+    return found[0] if found else None
+
+
+def _lx_text(node):
+    return ''.join(part.strip() for part in node.itertext()) if node is not None else None
+
+
+def _lx_cards(html):
+    root = lxml.html.fromstring(html)
+    for car in root.xpath(_has_class('div', 'vehicle-card')):
+        link = _lx_first(car, './/a[@href]')
+        button = _lx_first(car, _has_class('spark-button', 'monthly-payment-est-link'))
+        dealer_section = _lx_first(car, _has_class('div', 'vehicle-dealer'))
+        miles = _lx_first(dealer_section, ".//div[@data-qa='miles-from-user']") if dealer_section is not None else None
+        yield RawCard(
+            href=link.get('href') if link is not None else None,
+            title=_lx_text(_lx_first(car, _has_class('h2', 'title'))),
+            price=_lx_text(_lx_first(car, _has_class('span', 'primary-price'))),
+            payment=button.get('phx-value-monthly-payment') if button is not None else None,
+            mileage=_lx_text(_lx_first(car, _has_class('div', 'mileage'))),
+            dealer=_lx_text(_lx_first(car, _has_class('div', 'dealer-name'))),
+            region_text=_lx_text(miles),
+        )
+
+
+# BeautifulSoup
+
+def _bs_text(node):
+    return node.get_text(strip=True) if node is not None else None
+
+
+def _bs_cards(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    for car in soup.find_all('div', class_='vehicle-card'):
+        link = car.find('a', href=True)
+        button = car.find('spark-button', class_='monthly-payment-est-link')
+        dealer_section = car.find('div', class_='vehicle-dealer')
+        miles = dealer_section.find('div', {'data-qa': 'miles-from-user'}) if dealer_section is not None else None
+        yield RawCard(
+            href=link['href'] if link is not None else None,
+            title=_bs_text(car.select_one('h2.title')),
+            price=_bs_text(car.select_one('span.primary-price')),
+            payment=button.get('phx-value-monthly-payment') if button is not None else None,
+            mileage=_bs_text(car.select_one('div.mileage')),
+            dealer=_bs_text(car.select_one('div.dealer-name')),
+            region_text=_bs_text(miles),
+        )
+
+
+def iter_cards(html, backend='auto'):
+    """Yield one RawCard per vehicle card on the page"""
+    if backend == 'auto':
+        backend = available_backends()[0]
+    if backend == 'selectolax':
+        if HTMLParser is None:
+            raise ImportError("selectolax is not installed")
+        return _sx_cards(html)
+    if backend == 'lxml':
+        if lxml is None:
+            raise ImportError("lxml is not installed")
+        return _lx_cards(html)
+    if backend == 'bs4':
+        return _bs_cards(html)
+    raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+
+
+def parse_listings(html, make, model, backend='auto'):
+    """Parse a results page into car_info dicts, in page order"""
+    timestamp = pd.Timestamp.now()
+    return [build_car_info(card, make, model, timestamp) for card in iter_cards(html, backend)]
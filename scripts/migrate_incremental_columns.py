@@ -0,0 +1,88 @@
+# migrate_incremental_columns.py
+#
+# One-shot migration for incremental scraping: removes duplicate links
+# (keeping the newest row), makes link a unique key and adds the listing
+# fingerprint and first_seen/last_seen columns, backfilled from `time`.
+# Safe to re-run; finished steps are skipped.
+
+import sys
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / "car_score_api"))
+from env.config import config
+from db_pool import create_pool
+from migrate_numeric_columns import existing_columns, existing_indexes
+
+TABLE = "Cars"
+BATCH_SIZE = 5000
+
+NEW_COLUMNS = {
+    "fingerprint": "ADD COLUMN `fingerprint` char(40)",
+    "first_seen": "ADD COLUMN `first_seen` datetime",
+    "last_seen": "ADD COLUMN `last_seen` datetime",
+}
+
+INDEXES = {
+    "uniq_link": "ADD UNIQUE KEY `uniq_link` (`link`)",
+    "idx_last_seen": "ADD INDEX `idx_last_seen` (`last_seen`)",
+}
+
+# Newest id per duplicated link in one grouped pass, instead of a self-join on link
+DEDUPE = f"""
+    DELETE older FROM {TABLE} older
+    JOIN (
+        SELECT link, MAX(id) AS newest_id FROM {TABLE} GROUP BY link HAVING COUNT(*) > 1
+    ) duplicates ON duplicates.link = older.link AND older.id < duplicates.newest_id
+"""
+
+# `time` holds pandas timestamps like '2025-01-31 12:00:00.123456'
+BACKFILL = f"""
+    UPDATE {TABLE} SET
+        first_seen = CAST(LEFT(`time`, 19) AS DATETIME),
+        last_seen = CAST(LEFT(`time`, 19) AS DATETIME)
+    WHERE id BETWEEN %s AND %s AND last_seen IS NULL
+"""
+
+
+def migrate(conn):
+    with conn.cursor() as cursor:
+        # link becomes a VARCHAR first, so the dedupe groups and joins on it cheaply
+        columns = existing_columns(cursor)
+        changes = []
+        if columns.get("link") != ("varchar(512)", "NO"):
+            changes.append("MODIFY `link` varchar(512) NOT NULL")
+        changes += [ddl for name, ddl in NEW_COLUMNS.items() if name not in columns]
+        if changes:
+            cursor.execute(f"ALTER TABLE {TABLE} " + ", ".join(changes))
+        print(f"Altered {TABLE}: {len(changes)} column changes")
+
+        # Links are already unique once the key exists
+        if "uniq_link" not in existing_indexes(cursor):
+            deleted = cursor.execute(DEDUPE)
+            conn.commit()
+            print(f"Deleted {deleted} duplicate listings")
+
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM {TABLE}")
+        low, high = cursor.fetchone()
+        updated = 0
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                updated += cursor.execute(BACKFILL, (start, start + BATCH_SIZE - 1))
+                conn.commit()
+        print(f"Backfilled seen-at columns on {updated} rows")
+
+        indexes = existing_indexes(cursor)
+        missing = [ddl for name, ddl in INDEXES.items() if name not in indexes]
+        if missing:
+            cursor.execute(f"ALTER TABLE {TABLE} " + ", ".join(missing))
+        print(f"Created {len(missing)} indexes")
+
+
+if __name__ == "__main__":
+    db_pool = create_pool(config, max_size=1)
+    try:
+        with db_pool.connection() as conn:
+            migrate(conn)
+    finally:
+        db_pool.close()
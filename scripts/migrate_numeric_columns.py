@@ -0,0 +1,101 @@
+# migrate_numeric_columns.py
+#
+# One-shot migration for existing Cars tables: narrows make/model/state to
+# indexable VARCHARs, adds the parsed price_num/mileage_num/year_num columns,
+# backfills them in id ranges and creates the /cars indexes.
+# Safe to re-run; finished steps are skipped.
+
+import sys
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / "car_score_api"))
+from env.config import config
+from db_pool import create_pool
+
+TABLE = "Cars"
+BATCH_SIZE = 5000
+
+# Column name -> (COLUMN_TYPE, IS_NULLABLE) once migrated, and the change that gets it there
+COLUMN_CHANGES = {
+    "make": (("varchar(64)", "NO"), "MODIFY `make` varchar(64) NOT NULL"),
+    "model": (("varchar(128)", "NO"), "MODIFY `model` varchar(128) NOT NULL"),
+    "state": (("varchar(8)", "YES"), "MODIFY `state` varchar(8)"),
+}
+
+NEW_COLUMNS = {
+    "price_num": "ADD COLUMN `price_num` int unsigned NOT NULL DEFAULT 0",
+    "mileage_num": "ADD COLUMN `mileage_num` int unsigned NOT NULL DEFAULT 0",
+    "year_num": "ADD COLUMN `year_num` smallint unsigned",
+}
+
+INDEXES = {
+    "idx_make_model_state_value": "(`make`, `model`, `state`, `value`)",
+    "idx_price_mileage_value": "(`price_num`, `mileage_num`, `value`)",
+    "idx_mileage_price_value": "(`mileage_num`, `price_num`, `value`)",
+    "idx_value": "(`value`)",
+}
+
+# Keep only the digits, the same as the old CAST(REPLACE(...)) filters
+# (text without digits becomes 0 for price/mileage and NULL for year).
+# Only rows still at the new columns' defaults are touched, so a re-run
+# picks up where an interrupted backfill stopped.
+BACKFILL = f"""
+    UPDATE {TABLE} SET
+        price_num = CAST(COALESCE(NULLIF(REGEXP_REPLACE(COALESCE(price, ''), '[^0-9]', ''), ''), '0') AS UNSIGNED),
+        mileage_num = CAST(COALESCE(NULLIF(REGEXP_REPLACE(COALESCE(mileage, ''), '[^0-9]', ''), ''), '0') AS UNSIGNED),
+        year_num = CAST(NULLIF(REGEXP_REPLACE(COALESCE(`year`, ''), '[^0-9]', ''), '') AS UNSIGNED)
+    WHERE id BETWEEN %s AND %s AND price_num = 0 AND mileage_num = 0 AND year_num IS NULL
+"""
+
+
+def existing_columns(cursor):
+    """Column name -> (COLUMN_TYPE, IS_NULLABLE)"""
+    cursor.execute(
+        "SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (TABLE,)
+    )
+    return {name: (column_type.lower(), nullable) for name, column_type, nullable in cursor.fetchall()}
+
+
+def existing_indexes(cursor):
+    cursor.execute(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (TABLE,)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn):
+    with conn.cursor() as cursor:
+        columns = existing_columns(cursor)
+        changes = [ddl for name, (target, ddl) in COLUMN_CHANGES.items() if columns.get(name) != target]
+        changes += [ddl for name, ddl in NEW_COLUMNS.items() if name not in columns]
+        if changes:
+            cursor.execute(f"ALTER TABLE {TABLE} " + ", ".join(changes))
+        print(f"Altered {TABLE}: {len(changes)} column changes")
+
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM {TABLE}")
+        low, high = cursor.fetchone()
+        updated = 0
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                updated += cursor.execute(BACKFILL, (start, start + BATCH_SIZE - 1))
+                conn.commit()
+        print(f"Backfilled numeric columns on {updated} rows")
+
+        indexes = existing_indexes(cursor)
+        missing = [f"ADD INDEX `{name}` {cols}" for name, cols in INDEXES.items() if name not in indexes]
+        if missing:
+            cursor.execute(f"ALTER TABLE {TABLE} " + ", ".join(missing))
+        print(f"Created {len(missing)} indexes")
+
+
+if __name__ == "__main__":
+    db_pool = create_pool(config, max_size=1)
+    try:
+        with db_pool.connection() as conn:
+            migrate(conn)
+    finally:
+        db_pool.close()
@@ -0,0 +1,136 @@
+# pipeline.py
+#
+# Small bounded-queue pipeline for the scraper. Each Stage owns an input
+# queue and a fixed number of worker threads; a handler gets one item and
+# an emit() that hands results to the next stage. emit() blocks when the
+# next queue is full, so a slow stage holds back the ones before it and
+# memory stays flat however many models are crawled.
+
+import queue
+import time
+from threading import Lock, Thread
+
+_STOP = object()
+
+
+class Stage:
+
+    def __init__(self, name, handler, workers=1, queue_size=64, batch_size=1):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        # batch_size > 1 hands the handler a list of whatever is queued, up to that many items
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next = None
+        self.threads = []
+        self.stopping = False
+
+        self.stats_lock = Lock()
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started = None
+
+    def start(self):
+        self.started = time.monotonic()
+        for i in range(self.workers):
+            thread = Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def emit(self, item):
+        """Pass an item downstream, blocking while the next stage is full"""
+        if self.next is not None:
+            self.next.put(item)
+        with self.stats_lock:
+            self.emitted += 1
+
+    def stop(self):
+        """Let the workers finish what is queued, then wait for them"""
+        if not self.stopping:
+            self.stopping = True
+            for _ in self.threads:
+                self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def _next_items(self):
+        """Block for one item, then take up to batch_size - 1 more without waiting"""
+        items = [self.queue.get()]
+        while len(items) < self.batch_size and items[-1] is not _STOP:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._next_items()
+            stop = items[-1] is _STOP
+            if stop:
+                items.pop()
+            if items:
+                start = time.perf_counter()
+                try:
+                    self.handler(items if self.batch_size > 1 else items[0], self.emit)
+                except Exception as e:
+                    print(f"[{self.name}] failed: {e}")
+                    with self.stats_lock:
+                        self.errors += 1
+                with self.stats_lock:
+                    self.processed += len(items)
+                    self.busy_seconds += time.perf_counter() - start
+            if stop:
+                return
+
+    def stats(self):
+        with self.stats_lock:
+            elapsed = time.monotonic() - self.started if self.started else 0.0
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "processed": self.processed,
+                "emitted": self.emitted,
+                "errors": self.errors,
+                "items_per_second": round(self.processed / elapsed, 2) if elapsed else 0.0,
+                # Share of the workers' wall time spent in the handler
+                "utilization": round(self.busy_seconds / (elapsed * self.workers), 2) if elapsed else 0.0,
+            }
+
+
+class Pipeline:
+    """Stages chained in order; put() feeds the first one"""
+
+    def __init__(self, stages):
+        self.stages = stages
+        for stage, following in zip(stages, stages[1:]):
+            stage.next = following
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def put(self, item):
+        self.stages[0].put(item)
+
+    def close(self):
+        # Upstream first, so every stage drains before the next is stopped
+        for stage in self.stages:
+            stage.stop()
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def summary(self):
+        return "  ".join(
+            f"{name}: {s['queue_depth']}/{s['queue_size']} queued, {s['items_per_second']}/s"
+            for name, s in self.stats().items()
+        )